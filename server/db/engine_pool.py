@@ -1,7 +1,177 @@
 # server/db/engine_pool.py
-from functools import lru_cache
+import asyncio, logging, os, time
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from utils.metrics import instrument_engine, engine_label, detach_engine
+from utils.cancellation import track_engine
+
+log = logging.getLogger("dvp.engines")
+
+# ---------------------------------------------------------------------
+# Tuning profiles (applied to every engine created here)
+# ---------------------------------------------------------------------
+# SQLite: WAL lets readers keep going while an import holds the write lock;
+# busy_timeout makes writers wait instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "auto_vacuum": "INCREMENTAL",  # only takes on a new, empty file; lets deletes give space back
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",                                               # safe with WAL, far fewer fsyncs
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024))),  # negative = KiB
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+# Server databases (Postgres, MySQL, ...): pooled connections, checked before use.
+SERVER_POOL = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": True,
+}
+
+def _is_sqlite(db_url: str) -> bool:
+    return make_url(db_url).get_backend_name() == "sqlite"
+
+def _is_sqlite_memory(db_url: str) -> bool:
+    return make_url(db_url).database in (None, "", ":memory:")
+
+def engine_profile(db_url: str) -> dict:
+    """Name and settings of the tuning profile used for a URL (reported in metrics/logs)."""
+    if not _is_sqlite(db_url):
+        return {"profile": "server", **SERVER_POOL}
+    if _is_sqlite_memory(db_url):
+        return {"profile": "sqlite-memory"}
+    return {"profile": "sqlite", **SQLITE_PRAGMAS}
+
+def _apply_sqlite_pragmas(engine: AsyncEngine, pragmas: dict) -> None:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cur.execute(f"PRAGMA {name}={value}")
+        cur.close()
+
+def create_tuned_engine(db_url: str, **kwargs) -> AsyncEngine:
+    """create_async_engine() with the backend's tuning profile, metrics and cancellation hooks."""
+    opts = {"future": True, **kwargs}
+    if _is_sqlite(db_url):
+        engine = create_async_engine(db_url, **opts)
+        if not _is_sqlite_memory(db_url):
+            _apply_sqlite_pragmas(engine, SQLITE_PRAGMAS)
+    else:
+        engine = create_async_engine(db_url, **{**SERVER_POOL, **opts})
+    track_engine(engine)
+    return instrument_engine(engine, profile=engine_profile(db_url)["profile"])
+
+# ---------------------------------------------------------------------
+# Engine lifecycle
+# ---------------------------------------------------------------------
+ENGINE_CACHE_SIZE = int(os.getenv("ENGINE_CACHE_SIZE", "32"))
+WARMUP_CONNECTIONS = int(os.getenv("ENGINE_WARMUP_CONNECTIONS", "2"))  # per engine
+WARMUP_TIMEOUT = float(os.getenv("ENGINE_WARMUP_TIMEOUT", "10"))       # seconds per engine
+
+def _label(db_url: str) -> str:
+    return make_url(db_url).render_as_string(hide_password=True)
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    """Connection counts of an engine's pool (QueuePool fields are None for other pools)."""
+    pool = engine.sync_engine.pool
+    def _n(name):
+        fn = getattr(pool, name, None)
+        return fn() if callable(fn) else None
+    return {
+        "pool": type(pool).__name__,
+        "size": _n("size"),
+        "checked_in": _n("checkedin"),
+        "checked_out": _n("checkedout"),
+        "overflow": _n("overflow"),
+    }
+
+class EngineManager:
+    """
+    LRU cache of tuned engines, one per URL. Unlike a bare lru_cache it disposes
+    the engines it drops (evicted engines close their pooled connections instead
+    of leaking them), can pre-open pools, and disposes everything on shutdown.
+    """
+    def __init__(self, max_size: int = ENGINE_CACHE_SIZE):
+        self.max_size = max_size
+        self._engines: "OrderedDict[str, AsyncEngine]" = OrderedDict()
+        self._disposing: Set[asyncio.Task] = set()
+        self.evictions = 0
+
+    def get(self, db_url: str) -> AsyncEngine:
+        engine = self._engines.get(db_url)
+        if engine is not None:
+            self._engines.move_to_end(db_url)
+            return engine
+        engine = self._engines[db_url] = create_tuned_engine(db_url)
+        while len(self._engines) > self.max_size:
+            _, old = self._engines.popitem(last=False)
+            self.evictions += 1
+            self._dispose_later(old)
+        return engine
+
+    def _dispose_later(self, engine: AsyncEngine) -> None:
+        # idle connections close now; ones still checked out by a running request
+        # close when they are returned (SQLAlchemy detaches them from the pool)
+        detach_engine(engine)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            engine.sync_engine.dispose()
+            return
+        task = loop.create_task(engine.dispose())
+        self._disposing.add(task)
+        task.add_done_callback(self._disposing.discard)
+        log.info("evicted engine %s", engine_label(engine))
+
+    async def dispose_all(self) -> None:
+        engines = list(self._engines.values())
+        self._engines.clear()
+        for e in engines:
+            detach_engine(e)
+        await asyncio.gather(*(e.dispose() for e in engines), *self._disposing, return_exceptions=True)
+
+    async def _warm(self, db_url: str, connections: int) -> dict:
+        t0 = time.perf_counter()
+
+        async def touch(stack: AsyncExitStack):
+            conn = await stack.enter_async_context(engine.connect())
+            await conn.execute(text("SELECT 1"))
+
+        try:
+            engine = self.get(db_url)
+            size = pool_stats(engine)["size"]
+            n = max(1, min(connections, size)) if size else 1
+            # hold all n at once so the pool really ends up with n open connections
+            async with AsyncExitStack() as stack:
+                await asyncio.wait_for(asyncio.gather(*(touch(stack) for _ in range(n))), WARMUP_TIMEOUT)
+        except Exception as e:
+            log.warning("warmup failed for %s: %s", _label(db_url), e)
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "connections": n, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+    async def warmup(self, urls: Iterable[str], connections: int = WARMUP_CONNECTIONS) -> Dict[str, dict]:
+        """Open `connections` pooled connections per URL, all URLs in parallel. Never raises."""
+        urls = list(dict.fromkeys(urls))[: self.max_size]
+        results = await asyncio.gather(*(self._warm(u, connections) for u in urls))
+        return {_label(u): r for u, r in zip(urls, results)}
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._engines),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            "engines": {engine_label(e): pool_stats(e) for e in self._engines.values()},
+        }
+
+engines = EngineManager()
 
-@lru_cache(maxsize=32)
 def get_engine(db_url: str) -> AsyncEngine:
-    return create_async_engine(db_url, future=True)
+    return engines.get(db_url)
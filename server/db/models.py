@@ -18,6 +18,9 @@ class UploadFile(Base):
     # set a server default so inserts without a value still work
     is_active: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default="0")  # <-- add this
     created_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # scoped view: edges come from base_dataset_id, restricted to the engine ids in `scope`
+    base_dataset_id: Mapped[int] = mapped_column(ForeignKey("upload_file.id"), index=True, nullable=True)
+    scope: Mapped[str] = mapped_column(String, nullable=True)  # comma-joined sorted eng_ids
 
     relationships = relationship("Relationship", back_populates="dataset", cascade="all, delete-orphan")
 
@@ -33,4 +36,39 @@ class Relationship(Base):
     dataset = relationship("UploadFile", back_populates="relationships")
 
 Index("ix_rel_dataset_parent_seq", Relationship.dataset_id, Relationship.parent_item, Relationship.sequence_no)
-Index("ix_rel_dataset_child", Relationship.dataset_id, Relationship.child_item)
+# parent lookups (covering, already in level/sequence order, so no other index can save them a sort)
+# and node -> datasets containing it (degrees are counted from the index alone)
+Index(
+    "ix_rel_child_dataset_seq",
+    Relationship.child_item, Relationship.dataset_id, Relationship.level, Relationship.sequence_no, Relationship.parent_item,
+)
+Index("ix_rel_parent_dataset", Relationship.parent_item, Relationship.dataset_id, Relationship.child_item)
+# /levels summary and level listings (covering)
+Index("ix_rel_dataset_level_edges", Relationship.dataset_id, Relationship.level, Relationship.child_item, Relationship.parent_item)
+
+class RelationshipEngine(Base):
+    """
+    Edge -> engine_id provenance for new-schema datasets: one row per engine whose
+    CSV rows produced the edge. Scoped views filter their base dataset with it.
+    """
+    __tablename__ = "relationship_engine"
+    dataset_id:  Mapped[int] = mapped_column(ForeignKey("upload_file.id"), primary_key=True)
+    parent_item: Mapped[str] = mapped_column(String, primary_key=True)
+    child_item:  Mapped[str] = mapped_column(String, primary_key=True)
+    engine_id:   Mapped[str] = mapped_column(String, primary_key=True)
+
+class Ancestry(Base):
+    """
+    Reflexive transitive closure of a dataset's edges: one row per (descendant,
+    ancestor) pair, a node paired with itself at depth 0, with the shortest and
+    longest path length between them. Answers ancestor checks, lowest common
+    ancestors and subtree listings with one indexed lookup each.
+    """
+    __tablename__ = "ancestry"
+    dataset_id: Mapped[int] = mapped_column(ForeignKey("upload_file.id"), primary_key=True)
+    descendant: Mapped[str] = mapped_column(String, primary_key=True)
+    ancestor:   Mapped[str] = mapped_column(String, primary_key=True)
+    depth_min:  Mapped[int] = mapped_column(Integer, nullable=False)
+    depth_max:  Mapped[int] = mapped_column(Integer, nullable=False)
+
+Index("ix_anc_dataset_ancestor", Ancestry.dataset_id, Ancestry.ancestor, Ancestry.descendant)
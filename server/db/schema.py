@@ -0,0 +1,179 @@
+# server/db/schema.py
+from __future__ import annotations
+import asyncio, itertools, logging
+from sqlalchemy import func, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from db.models import Base, Relationship
+
+log = logging.getLogger("dvp.schema")
+
+# Indexes older versions declared that newer ones replace, per table.
+OBSOLETE_INDEXES = {
+    "relationship": ("ix_rel_dataset_child", "ix_rel_dataset_level", "ix_rel_child_dataset", "ix_rel_level_dataset"),
+}
+
+def ensure_graph_schema(conn: Connection) -> list[str]:
+    """
+    Create missing graph tables/indexes and add columns that newer models
+    expect on tables created by older versions (create_all never alters them),
+    and drop indexes that newer ones replace. Run via
+    `await conn.run_sync(ensure_graph_schema)`. Returns what changed, e.g.
+    ["table relationship_engine", "column upload_file.scope", "index ix_rel_child_dataset_seq",
+    "dropped index ix_rel_dataset_child"].
+    """
+    insp = inspect(conn)
+    before = set(insp.get_table_names())
+    Base.metadata.create_all(conn)
+    added = [f"table {t.name}" for t in Base.metadata.sorted_tables if t.name not in before]
+
+    insp = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in have:
+                continue
+            if not col.nullable and col.server_default is None:
+                raise RuntimeError(f"cannot add NOT NULL column {table.name}.{col.name} without a default")
+            ddl = col.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {ddl}')
+            added.append(f"column {table.name}.{col.name}")
+
+    # create_all only builds indexes together with new tables; add any declared
+    # index that an existing table is missing (e.g. on a freshly added column)
+    for table in Base.metadata.sorted_tables:
+        have = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for ix in table.indexes:
+            if ix.name not in have:
+                ix.create(conn)
+                added.append(f"index {ix.name}")
+
+    for table, names in OBSOLETE_INDEXES.items():
+        have = {ix["name"] for ix in insp.get_indexes(table)}
+        for name in names:
+            if name in have:
+                on = f" ON {table}" if conn.dialect.name == "mysql" else ""
+                conn.exec_driver_sql(f"DROP INDEX {name}{on}")
+                added.append(f"dropped index {name}")
+    return added
+
+# ---------------------------------------------------------------------
+# hot-query plan check
+# ---------------------------------------------------------------------
+# The lookups behind /child_node, /parent_node, /levels and /presence, with the index each must use.
+HOT_QUERIES = {
+    "children": (
+        "ix_rel_dataset_parent_seq",
+        select(Relationship.child_item, Relationship.sequence_no, Relationship.level)
+        .where((Relationship.dataset_id == -1) & (Relationship.parent_item == "?"))
+        .order_by(Relationship.sequence_no.asc()),
+    ),
+    "parents": (
+        "ix_rel_child_dataset_seq",
+        select(Relationship.parent_item, Relationship.sequence_no, Relationship.level)
+        .where((Relationship.dataset_id == -1) & (Relationship.child_item == "?"))
+        .order_by(Relationship.level.asc(), Relationship.sequence_no.asc()),
+    ),
+    "level": (
+        "ix_rel_dataset_level_edges",
+        select(Relationship.child_item)
+        .where((Relationship.dataset_id == -1) & (Relationship.level == -1))
+        .order_by(Relationship.child_item.asc()),
+    ),
+    "level_summary": (
+        "ix_rel_dataset_level_edges",
+        select(Relationship.level, func.count(), func.count(Relationship.child_item.distinct()))
+        .where(Relationship.dataset_id == -1)
+        .group_by(Relationship.level),
+    ),
+    "presence_in": (
+        "ix_rel_child_dataset_seq",
+        select(Relationship.dataset_id, func.count(Relationship.parent_item.distinct()))
+        .where(Relationship.child_item == "?")
+        .group_by(Relationship.dataset_id),
+    ),
+    "presence_out": (
+        "ix_rel_parent_dataset",
+        select(Relationship.dataset_id, func.count(Relationship.child_item.distinct()))
+        .where(Relationship.parent_item == "?")
+        .group_by(Relationship.dataset_id),
+    ),
+}
+
+# plan fragments meaning "reads the whole relationship table"
+_SCAN_MARKERS = ("SCAN relationship", "Seq Scan on relationship", "type: ALL")
+
+_nonce = itertools.count(1)
+
+def _explain(conn: Connection, stmt) -> str:
+    # fresh literal per call: pysqlite caches statements by text and a cached
+    # EXPLAIN is never re-prepared, so it would keep describing the old indexes
+    stmt = stmt.where(Relationship.id != -next(_nonce))
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    rows = conn.exec_driver_sql(prefix + sql).fetchall()
+    if conn.dialect.name == "mysql":
+        return "\n".join(f"type: {r.type} key: {r.key}" for r in rows)
+    return "\n".join(str(r[-1]) for r in rows)
+
+def check_query_plans(conn: Connection) -> dict:
+    """
+    EXPLAIN the hot lookups and report whether they use their composite index.
+    Run via `await conn.run_sync(check_query_plans)`. `degraded` lists queries
+    that would read the whole relationship table.
+    """
+    if conn.dialect.name == "postgresql":
+        # small/empty tables make the planner prefer seq scans; ask whether the index *can* be used
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    have = {ix["name"] for ix in inspect(conn).get_indexes(Relationship.__tablename__)}
+    queries, degraded = {}, []
+    for name, (index, stmt) in HOT_QUERIES.items():
+        plan = _explain(conn, stmt)
+        full_scan = any(m in plan for m in _SCAN_MARKERS)
+        queries[name] = {
+            "index": index,
+            "index_present": index in have,
+            "uses_index": index in plan,
+            "full_scan": full_scan,
+            "plan": plan,
+        }
+        if full_scan or index not in have:
+            degraded.append(name)
+    return {"queries": queries, "degraded": degraded}
+
+async def bootstrap_graph_db(engine: AsyncEngine) -> dict:
+    """
+    Ensure the graph schema on a connection, then verify the hot-query plans.
+    Safe to run concurrently from several workers: a DDL race is retried once.
+    """
+    try:
+        async with engine.begin() as conn:
+            added = await conn.run_sync(ensure_graph_schema)
+    except (OperationalError, ProgrammingError):
+        async with engine.begin() as conn:
+            added = await conn.run_sync(ensure_graph_schema)
+    async with engine.begin() as conn:
+        report = await conn.run_sync(check_query_plans)
+    return {"added": added, **report}
+
+async def bootstrap_registered(connections: list[dict], get_engine) -> dict[int, dict]:
+    """
+    Run bootstrap_graph_db for each registry connection (id, name, url), in parallel.
+    Failures and degraded plans are logged and returned, never raised.
+    """
+    async def one(c: dict) -> dict:
+        try:
+            report = await bootstrap_graph_db(get_engine(c["url"]))
+        except Exception as e:
+            log.warning("schema bootstrap failed for connection %s (%s): %s", c["id"], c["name"], e)
+            return {"error": str(e)}
+        if report["added"]:
+            log.info("connection %s (%s): added %s", c["id"], c["name"], ", ".join(report["added"]))
+        if report["degraded"]:
+            log.warning("connection %s (%s): %s lookups fall back to full scans",
+                        c["id"], c["name"], ", ".join(report["degraded"]))
+        return report
+
+    results = await asyncio.gather(*(one(c) for c in connections))
+    return {c["id"]: r for c, r in zip(connections, results)}
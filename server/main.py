@@ -3,16 +3,27 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import AsyncEngine
-from sqlalchemy import text
-from db.models import Base as GraphBase
+from sqlalchemy.exc import OperationalError
+from db.schema import ensure_graph_schema, bootstrap_registered
+from registry.api import list_connections
 from registry.models import Base as RegistryBase
-from db.engine_pool import get_engine
-from registry.session import registry_engine
+from db.engine_pool import get_engine, engines
+from registry.session import registry_engine, RegistrySessionLocal
+from utils.metrics import MetricsMiddleware
+from utils.cancellation import CancelOnDisconnectMiddleware
 
 from routes.root_node import router as root_router
 from routes.child_node import router as child_router
 from routes.sources import router as sources_router
 from routes.upload_csv import router as upload_router
+from routes.metrics import router as metrics_router
+from routes.bom import router as bom_router
+from routes.layout import router as layout_router
+from routes.stream import router as stream_router
+from routes.levels import router as levels_router
+from routes.ancestry import router as ancestry_router
+from routes.presence import router as presence_router
+from routes.datasets import router as datasets_router
 
 
 import os
@@ -20,27 +31,38 @@ import os
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- startup ---
-    # 1) ensure registry tables
-    async with registry_engine.begin() as conn:
-        await conn.run_sync(RegistryBase.metadata.create_all)
+    # 1) ensure registry tables (with --workers N every worker races to create them;
+    #    a loser sees "already exists" and simply re-checks)
+    try:
+        async with registry_engine.begin() as conn:
+            await conn.run_sync(RegistryBase.metadata.create_all)
+    except OperationalError:
+        async with registry_engine.begin() as conn:
+            await conn.run_sync(RegistryBase.metadata.create_all)
 
     # 2) ensure default graph DB tables (so a local SQLite conn works out-of-the-box)
     default_url = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./data/app.db")
     default_engine: AsyncEngine = get_engine(default_url)
     async with default_engine.begin() as conn:
-        await conn.run_sync(GraphBase.metadata.create_all)
+        await conn.run_sync(ensure_graph_schema)
 
-    # 3) optional warmup
-    async with default_engine.connect() as c:
-        await c.execute(text("SELECT 1"))
+    async with RegistrySessionLocal() as reg:
+        conns = [c for c in await list_connections(reg) if c["url"] != default_url]
+
+    # 3) create/verify schema + indexes on every registered connection (report full-scan plans)
+    if os.getenv("SCHEMA_BOOTSTRAP_ON_STARTUP", "1") != "0":
+        app.state.schema_reports = await bootstrap_registered(conns, get_engine)
+
+    # 4) pre-open pools for the default DB and every registered connection (in parallel),
+    #    so the first request after a deploy doesn't pay connection setup
+    app.state.warmup = await engines.warmup([default_url, *(c["url"] for c in conns)])
 
     yield  # --- application runs here ---
 
     # --- shutdown ---
-    # If you want, dispose cached engines here. get_engine() is lru-cached; you can no-op, or:
-    # from sqlalchemy.ext.asyncio import AsyncEngine
-    # for url in list_of_urls_you_used:
-    #     await get_engine(url).dispose()
+    # close every pooled connection (graph engines + registry) instead of leaving it to GC
+    await engines.dispose_all()
+    await registry_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -53,11 +75,25 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+# stop work (and interrupt SQL) for requests whose client has gone away
+app.add_middleware(CancelOnDisconnectMiddleware)
+
+# per-route latency + SQL statement counts (see GET /api/metrics)
+app.add_middleware(MetricsMiddleware)
+
 # Routers
 app.include_router(sources_router, prefix="/api")
 app.include_router(root_router,    prefix="/api")
 app.include_router(child_router,   prefix="/api")
 app.include_router(upload_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
+app.include_router(bom_router,    prefix="/api")
+app.include_router(layout_router, prefix="/api")
+app.include_router(stream_router, prefix="/api")
+app.include_router(levels_router, prefix="/api")
+app.include_router(ancestry_router, prefix="/api")
+app.include_router(presence_router, prefix="/api")
+app.include_router(datasets_router, prefix="/api")
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,9 +1,16 @@
 # server/registry/api.py
 from __future__ import annotations
-from typing import Optional
+import os, time
+from typing import Optional, Dict, Any, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from .models import DbConnection
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from .models import DbConnection, UserSource
+
+# Seconds a worker may serve a user's source selection from its local cache
+# before re-reading the registry (selections made on other workers show up
+# after at most this long; selections made on this worker show up at once).
+ACTIVE_SOURCE_TTL = float(os.getenv("ACTIVE_SOURCE_CACHE_TTL", "2"))
 
 async def list_connections(db: AsyncSession) -> list[dict]:
     res = await db.execute(select(DbConnection).order_by(DbConnection.created_at.desc()))
@@ -26,3 +33,52 @@ async def register_connection(db: AsyncSession, name: str, url: str, api_key: Op
 
 async def get_connection(db: AsyncSession, conn_id: int) -> Optional[DbConnection]:
     return await db.get(DbConnection, conn_id)
+
+# ---------------------------------------------------------------------
+# per-user source selection (registry table + read-through cache)
+# ---------------------------------------------------------------------
+_source_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+async def set_user_source(db: AsyncSession, user_id: str, connection_id: int, dataset_id: int) -> Dict[str, Any]:
+    """Remember which connection+dataset a user selected."""
+    row = await db.get(UserSource, user_id)
+    if row is None:
+        db.add(UserSource(user_id=user_id, connection_id=connection_id, dataset_id=dataset_id))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # another worker inserted the same user concurrently -> update instead
+            await db.rollback()
+            row = await db.get(UserSource, user_id)
+    if row is not None:
+        row.connection_id = connection_id
+        row.dataset_id = dataset_id
+        await db.commit()
+
+    src = {"connection_id": connection_id, "dataset_id": dataset_id}
+    _source_cache[user_id] = (time.monotonic(), src)
+    return src
+
+async def get_user_source(db: AsyncSession, user_id: str) -> Optional[Dict[str, Any]]:
+    """Return the active source for a given user, if any."""
+    hit = _source_cache.get(user_id)
+    if hit and time.monotonic() - hit[0] < ACTIVE_SOURCE_TTL:
+        return hit[1]
+    row = await db.get(UserSource, user_id, populate_existing=True)
+    if row is None:
+        _source_cache.pop(user_id, None)
+        return None
+    src = {"connection_id": row.connection_id, "dataset_id": row.dataset_id}
+    _source_cache[user_id] = (time.monotonic(), src)
+    return src
+
+async def clear_dataset_selections(db: AsyncSession, connection_id: int, dataset_ids: list[int]) -> int:
+    """Drop users' selections of deleted datasets (their ids may be reused later). Returns how many."""
+    res = await db.execute(
+        delete(UserSource).where((UserSource.connection_id == connection_id) & UserSource.dataset_id.in_(dataset_ids))
+    )
+    await db.commit()
+    for user_id, (_, src) in list(_source_cache.items()):
+        if src["connection_id"] == connection_id and src["dataset_id"] in dataset_ids:
+            _source_cache.pop(user_id, None)
+    return res.rowcount or 0
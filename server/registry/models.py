@@ -1,6 +1,6 @@
 # server/registry/models.py
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Integer, String, Boolean, DateTime, func
+from sqlalchemy import Integer, String, Boolean, DateTime, ForeignKey, func
 
 class Base(DeclarativeBase): pass
 
@@ -13,3 +13,11 @@ class DbConnection(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
     last_used_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class UserSource(Base):
+    """Per-user active source selection; shared by every worker process."""
+    __tablename__ = "user_source"
+    user_id: Mapped[str] = mapped_column(String, primary_key=True)
+    connection_id: Mapped[int] = mapped_column(ForeignKey("db_connection.id"), nullable=False)
+    dataset_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
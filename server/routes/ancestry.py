@@ -0,0 +1,144 @@
+# server/routes/ancestry.py
+from __future__ import annotations
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Header, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from registry.session import get_registry_session
+from registry.api import get_connection
+from db.engine_pool import get_engine
+from storage.sql_repository import SqlGraphRepository
+from utils.admission import admit
+from utils.ancestry import ClosureTooLarge, CyclicGraph
+
+router = APIRouter()
+
+async def _session(reg: AsyncSession, connection_id: int, api_key: Optional[str]):
+    dbrow = await get_connection(reg, connection_id)
+    if not dbrow:
+        raise HTTPException(status_code=404, detail="connection not found")
+    if dbrow.api_key and api_key != dbrow.api_key:
+        raise HTTPException(status_code=401, detail="invalid API key")
+    return sessionmaker(bind=get_engine(dbrow.url), class_=AsyncSession, expire_on_commit=False)
+
+async def _indexed_repo(sess: AsyncSession, dataset_id: int) -> SqlGraphRepository:
+    repo = SqlGraphRepository(sess)
+    if not await repo.has_ancestry(dataset_id):
+        raise HTTPException(
+            status_code=409,
+            detail="dataset has no ancestry index; build it with POST /api/ancestry/build",
+        )
+    return repo
+
+@router.post("/ancestry/build", dependencies=[Depends(admit("import"))])
+async def build_ancestry(
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """(Re)build a dataset's ancestry index, e.g. for datasets imported before it existed."""
+    Session = await _session(reg, connection_id, api_key)
+    async with Session() as sess:
+        repo = SqlGraphRepository(sess)
+        try:
+            pairs = await repo.build_ancestry(dataset_id, strict=True)
+        except (ClosureTooLarge, CyclicGraph) as e:
+            raise HTTPException(status_code=422, detail=f"cannot build ancestry index: {e}")
+        await repo.commit()
+    return {"message": "ancestry index built", "dataset_id": dataset_id, "pairs": pairs}
+
+@router.get("/ancestry/is_ancestor", dependencies=[Depends(admit("navigation"))])
+async def is_ancestor(
+    ancestor: str = Query(...),
+    descendant: str = Query(...),
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """Whether `ancestor` is above `descendant`, with the shortest and longest path between them."""
+    Session = await _session(reg, connection_id, api_key)
+    async with Session() as sess:
+        repo = await _indexed_repo(sess, dataset_id)
+        hit = await repo.ancestry_pair(dataset_id, ancestor, descendant)
+    is_anc = hit is not None and ancestor != descendant
+    return {
+        "ancestor": ancestor,
+        "descendant": descendant,
+        "is_ancestor": is_anc,
+        "distance_min": hit[0] if is_anc else None,
+        "distance_max": hit[1] if is_anc else None,
+    }
+
+@router.get("/ancestry/lca", dependencies=[Depends(admit("navigation"))])
+async def lowest_common_ancestor(
+    a: str = Query(...),
+    b: str = Query(...),
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    Lowest common ancestors (common sub-assemblies) of `a` and `b`, nearest
+    first. A part reused under several assemblies can have more than one.
+    """
+    Session = await _session(reg, connection_id, api_key)
+    async with Session() as sess:
+        repo = await _indexed_repo(sess, dataset_id)
+        lca = await repo.lowest_common_ancestors(dataset_id, a, b)
+    return {"a": a, "b": b, "lca": lca}
+
+@router.get("/ancestry/{node_id}/ancestors", dependencies=[Depends(admit("navigation"))])
+async def get_ancestors(
+    node_id: str,
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """Every assembly above `node_id`, nearest first."""
+    Session = await _session(reg, connection_id, api_key)
+    async with Session() as sess:
+        repo = await _indexed_repo(sess, dataset_id)
+        ancestors = await repo.ancestors(dataset_id, node_id)
+    return {"id": node_id, "count": len(ancestors), "ancestors": ancestors}
+
+@router.get("/ancestry/{node_id}/descendants", dependencies=[Depends(admit("navigation"))])
+async def get_descendants(
+    node_id: str,
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    max_depth: Optional[int] = Query(None, ge=1, description="Only descendants at most this many levels down"),
+    after: Optional[str] = Query(None, description="Cursor: the `next` value of the previous page"),
+    limit: int = Query(100, ge=1, le=5000),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """The whole subtree under `node_id` as one indexed range, ordered by id and cursor-paginated."""
+    Session = await _session(reg, connection_id, api_key)
+    async with Session() as sess:
+        repo = await _indexed_repo(sess, dataset_id)
+        nodes, total = await repo.descendants(dataset_id, node_id, max_depth, after, limit + 1)
+    more = len(nodes) > limit
+    nodes = nodes[:limit]
+    return {"id": node_id, "total": total, "count": len(nodes), "descendants": nodes,
+            "next": nodes[-1]["id"] if more else None}
+
+@router.get("/ancestry/{node_id}/depth", dependencies=[Depends(admit("navigation"))])
+async def get_depth(
+    node_id: str,
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """Shortest and longest distance from a root down to `node_id`."""
+    Session = await _session(reg, connection_id, api_key)
+    async with Session() as sess:
+        repo = await _indexed_repo(sess, dataset_id)
+        depth = await repo.node_depth(dataset_id, node_id)
+    if depth is None:
+        raise HTTPException(status_code=404, detail=f"Node {node_id} not found.")
+    return depth
@@ -0,0 +1,65 @@
+# server/routes/bom.py
+from __future__ import annotations
+from typing import Literal
+from fastapi import APIRouter, Depends, Query, Header, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from registry.session import get_registry_session
+from registry.api import get_connection
+from db.engine_pool import get_engine
+from storage.sql_repository import SqlGraphRepository
+from utils.admission import admit
+from utils.bom import CyclicSubtree
+
+router = APIRouter()
+
+_SORT_KEYS = {
+    "occurrences": None,  # repository order: most frequent first, then id
+    "id": lambda x: x["id"],
+    "depth": lambda x: (x["min_depth"], x["id"]),
+}
+
+@router.get("/explode/{root_id}", dependencies=[Depends(admit("traversal"))])
+async def explode_root(
+    root_id: str,
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    sort: Literal["occurrences", "id", "depth"] = Query("occurrences", description="Sort order of the items"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=10_000),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    BOM explosion: for every part below `root_id`, how many times it occurs
+    under the root across all paths (`occurrences`), its shallowest and deepest
+    depth, and its number of distinct parents within the explosion.
+    """
+    dbrow = await get_connection(reg, connection_id)
+    if not dbrow:
+        raise HTTPException(status_code=404, detail="connection not found")
+    if dbrow.api_key and api_key != dbrow.api_key:
+        raise HTTPException(status_code=401, detail="invalid API key")
+
+    engine = get_engine(dbrow.url)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as sess:
+        repo = SqlGraphRepository(sess)
+        try:
+            items, exact = await repo.explode(dataset_id, root_id)
+        except CyclicSubtree as e:
+            raise HTTPException(status_code=422, detail=f"cannot explode {root_id}: {e}")
+        # a root always has descendants, so no items and no parent means no such node
+        if not items and not await repo.get_parent(dataset_id, root_id):
+            raise HTTPException(status_code=404, detail=f"Node {root_id} not found.")
+
+    key = _SORT_KEYS[sort]
+    ordered = items if key is None else sorted(items, key=key)
+    return {
+        "root": root_id,
+        "total": len(items),
+        "offset": offset,
+        "limit": limit,
+        "exact": exact,
+        "items": ordered[offset:offset + limit],
+    }
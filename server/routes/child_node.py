@@ -7,10 +7,11 @@ from registry.session import get_registry_session
 from registry.api import get_connection
 from db.engine_pool import get_engine
 from storage.sql_repository import SqlGraphRepository
+from utils.admission import admit
 
 router = APIRouter()
 
-@router.get("/child_node")
+@router.get("/child_node", dependencies=[Depends(admit("navigation"))])
 async def get_child_node(
     connection_id: int = Query(..., description="DB connection id"),
     dataset_id: int = Query(..., description="Dataset id within that DB"),
@@ -35,7 +36,7 @@ async def get_child_node(
             return {"error": f"Node {node_id} not found", "children": [], "count_children": 0}
         return {"search_id": node_id, "parent": parent, "children": children, "count_children": len(children)}
     
-@router.get("/sources/children/path/{child_id}")
+@router.get("/sources/children/path/{child_id}", dependencies=[Depends(admit("traversal"))])
 async def get_child_path(
     child_id: str,
     connection_id: int,
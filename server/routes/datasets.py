@@ -0,0 +1,154 @@
+# server/routes/datasets.py
+from __future__ import annotations
+import asyncio, json, logging
+from typing import Optional
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from registry.session import get_registry_session
+from registry.api import get_connection, clear_dataset_selections
+from db.engine_pool import get_engine
+from storage.sql_repository import SqlGraphRepository
+from storage.dataset_copy import copy_dataset, DatasetNotFound
+from storage.dataset_delete import delete_dataset, reclaim_space, DatasetInUse
+from utils.admission import admit, scheduler
+
+router = APIRouter()
+log = logging.getLogger("dvp.datasets")
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+async def _checked_connection(reg: AsyncSession, connection_id, api_key: Optional[str], what: str = ""):
+    dbrow = await get_connection(reg, connection_id)
+    if not dbrow:
+        raise HTTPException(status_code=404, detail=f"{what} connection not found".lstrip())
+    if dbrow.api_key and api_key != dbrow.api_key:
+        raise HTTPException(status_code=401, detail=f"invalid API key for the {what} connection" if what else "invalid API key")
+    return dbrow
+
+@router.post("/datasets/{dataset_id}/copy")
+async def copy_dataset_between_connections(
+    dataset_id: int,
+    payload: dict = Body(..., example={"source_connection_id": 1, "target_connection_id": 2}),
+    progress: bool = Query(False, description="Stream progress as server-sent events"),
+    api_key: Optional[str] = Header(default=None, alias="x-api-key"),
+    target_api_key: Optional[str] = Header(default=None, alias="x-target-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    Copy a dataset (its upload_file row, edges, engine provenance and ancestry
+    index) to another registered connection, keeping its sha. No CSV is
+    needed or parsed. `x-api-key` is checked against the source connection,
+    `x-target-api-key` (default: the same key) against the target.
+
+    Returns {"status": "copied" | "exists", "dataset_id" (on the target),
+    "sha256", "rows": {table: n}, "elapsed_ms"}. With `progress=true` the
+    response is an event stream instead: `progress` events
+    {sha256, table, rows, total} after each batch, then `done` with that
+    result, or `error` {status, detail}.
+    """
+    src_id = payload.get("source_connection_id")
+    dst_id = payload.get("target_connection_id")
+    if not src_id or not dst_id:
+        raise HTTPException(status_code=400, detail="source_connection_id and target_connection_id required")
+    src_row = await _checked_connection(reg, src_id, api_key, "source")
+    dst_row = await _checked_connection(reg, dst_id, target_api_key or api_key, "target")
+    if src_row.url == dst_row.url:
+        raise HTTPException(status_code=400, detail="source and target are the same database")
+
+    SrcSession = sessionmaker(bind=get_engine(src_row.url), class_=AsyncSession, expire_on_commit=False)
+    DstSession = sessionmaker(bind=get_engine(dst_row.url), class_=AsyncSession, expire_on_commit=False)
+    async with SrcSession() as sess:
+        if await SqlGraphRepository(sess).dataset_record(dataset_id) is None:
+            raise HTTPException(status_code=404, detail=f"Dataset {dataset_id} not found in connection {src_id}")
+
+    # the slot is held until the copy is done, also when the body is streamed
+    release = await scheduler.hold("export")
+
+    async def events():
+        async with SrcSession() as s, DstSession() as d:
+            async for ev in copy_dataset(SqlGraphRepository(s), SqlGraphRepository(d), dataset_id):
+                if ev["event"] == "done":
+                    log.info("dataset %s copied from connection %s to %s as %s (%s)",
+                             dataset_id, src_id, dst_id, ev["dataset_id"], ev["status"])
+                yield ev
+
+    if not progress:
+        try:
+            async for ev in events():
+                result = ev  # the last event is "done"
+        except DatasetNotFound:
+            raise HTTPException(status_code=404, detail=f"Dataset {dataset_id} not found in connection {src_id}")
+        finally:
+            release()
+        result.pop("event")
+        return result
+
+    async def pump(queue: asyncio.Queue) -> None:
+        try:
+            async for ev in events():
+                await queue.put(_sse(ev.pop("event"), ev))
+        except HTTPException as e:  # e.g. statement timeout (504)
+            await queue.put(_sse("error", {"status": e.status_code, "detail": e.detail}))
+        except DatasetNotFound:
+            await queue.put(_sse("error", {"status": 404, "detail": f"Dataset {dataset_id} not found in connection {src_id}"}))
+        except Exception:
+            log.exception("dataset copy failed")
+            await queue.put(_sse("error", {"status": 500, "detail": "internal error"}))
+        finally:
+            if not asyncio.current_task().cancelling():
+                await queue.put(None)
+
+    async def stream():
+        # the copy runs in its own task (see routes/stream.py): a client that
+        # goes away cancels it once, and its target transaction rolls back
+        queue: asyncio.Queue = asyncio.Queue(maxsize=4)
+        worker = asyncio.create_task(pump(queue))
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+        finally:
+            worker.cancel()
+            release()
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.delete("/datasets/{dataset_id}", dependencies=[Depends(admit("import"))])
+async def delete_dataset_route(
+    dataset_id: int,
+    connection_id: int = Query(..., description="DB connection id"),
+    cascade: bool = Query(False, description="Also delete scoped views over this dataset"),
+    api_key: Optional[str] = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    Delete a dataset: its edges, engine provenance and ancestry rows go in
+    bounded DELETE batches, each committed on its own, then the dataset row.
+    A dataset that scoped views read from answers 409 unless `cascade=true`.
+    Freed space is then reclaimed in the background where the database
+    allows it (`reclaim`). Cached layouts and users' selections of the
+    dataset are dropped.
+    """
+    dbrow = await _checked_connection(reg, connection_id, api_key)
+    engine = get_engine(dbrow.url)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as sess:
+        try:
+            result = await delete_dataset(SqlGraphRepository(sess), dataset_id, cascade=cascade)
+        except LookupError:
+            raise HTTPException(status_code=404, detail=f"Dataset {dataset_id} not found in connection {connection_id}")
+        except DatasetInUse as e:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Dataset {dataset_id} is the base of scoped views {e.views}; delete them first or pass cascade=true",
+            )
+    result["selections_cleared"] = await clear_dataset_selections(
+        reg, connection_id, [dataset_id, *result["views_deleted"]]
+    )
+    result["reclaim"] = await reclaim_space(engine)
+    return {"message": "dataset deleted", **result}
@@ -0,0 +1,54 @@
+# server/routes/layout.py
+from __future__ import annotations
+import os
+from typing import Literal
+from fastapi import APIRouter, Depends, Query, Header, HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from registry.session import get_registry_session
+from registry.api import get_connection
+from db.engine_pool import get_engine
+from storage.sql_repository import SqlGraphRepository
+from utils.admission import admit
+from utils.tree_layout import LayoutParams
+
+router = APIRouter()
+
+MAX_NODES = int(os.getenv("LAYOUT_MAX_NODES", "50000"))
+
+@router.get("/layout/{root_id}", dependencies=[Depends(admit("traversal"))])
+async def get_layout(
+    root_id: str,
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    depth: int = Query(3, ge=0, le=64, description="Levels below the root to lay out"),
+    orientation: Literal["horizontal", "vertical"] = Query("horizontal"),
+    node_width: float = Query(180, gt=0),
+    node_height: float = Query(60, gt=0),
+    spacing: float = Query(20, ge=0),
+    max_nodes: int = Query(5000, ge=1, le=MAX_NODES, description="Stop placing nodes after this many"),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    Node coordinates for the subtree under `root_id`, laid out server side
+    with the same tidy-tree algorithm and node spacing as the frontend's d3
+    `tree()`, so the client can place thousands of nodes without layout work.
+    """
+    dbrow = await get_connection(reg, connection_id)
+    if not dbrow:
+        raise HTTPException(status_code=404, detail="connection not found")
+    if dbrow.api_key and api_key != dbrow.api_key:
+        raise HTTPException(status_code=401, detail="invalid API key")
+
+    params = LayoutParams(orientation, node_width, node_height, spacing)
+    engine = get_engine(dbrow.url)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as sess:
+        repo = SqlGraphRepository(sess)
+        result = await repo.tree_layout(dataset_id, root_id, depth, params, max_nodes)
+        if result["count"] == 1 and not result["nodes"][0]["num_children"] and not await repo.get_parent(dataset_id, root_id):
+            raise HTTPException(status_code=404, detail=f"Node {root_id} not found.")
+    # plain JSON types already; skip jsonable_encoder, which dominates for large layouts
+    return JSONResponse(result)
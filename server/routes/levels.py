@@ -0,0 +1,79 @@
+# server/routes/levels.py
+from __future__ import annotations
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Header, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from registry.session import get_registry_session
+from registry.api import get_connection
+from db.engine_pool import get_engine
+from storage.sql_repository import SqlGraphRepository
+from utils.admission import admit
+
+router = APIRouter()
+
+async def _check_engine_filter(repo: SqlGraphRepository, dataset_id: int, engine_id: Optional[str]) -> None:
+    if engine_id is not None and not await repo.supports_engine_filter(dataset_id):
+        raise HTTPException(
+            status_code=409,
+            detail="dataset has no engine provenance (imported before it was recorded); "
+                   "import any eng_id scope of its file once to backfill it",
+        )
+
+async def _repo_session(reg: AsyncSession, connection_id: int, api_key: Optional[str]):
+    dbrow = await get_connection(reg, connection_id)
+    if not dbrow:
+        raise HTTPException(status_code=404, detail="connection not found")
+    if dbrow.api_key and api_key != dbrow.api_key:
+        raise HTTPException(status_code=401, detail="invalid API key")
+    engine = get_engine(dbrow.url)
+    return sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+@router.get("/levels", dependencies=[Depends(admit("traversal"))])
+async def get_level_summary(
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    engine_id: Optional[str] = Query(None, description="Only edges from this engine's rows (new schema)"),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    Fan-out overview per BOM level: edges, distinct nodes and parents, average
+    and max fan-out, and leaf count at each level.
+    """
+    Session = await _repo_session(reg, connection_id, api_key)
+    async with Session() as sess:
+        repo = SqlGraphRepository(sess)
+        await _check_engine_filter(repo, dataset_id, engine_id)
+        levels = await repo.level_summary(dataset_id, engine_id)
+    return {"dataset_id": dataset_id, "engine_id": engine_id, "levels": levels}
+
+@router.get("/levels/{level}/nodes", dependencies=[Depends(admit("navigation"))])
+async def get_level_nodes(
+    level: int,
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    engine_id: Optional[str] = Query(None, description="Only edges from this engine's rows (new schema)"),
+    after: Optional[str] = Query(None, description="Cursor: the `next` value of the previous page"),
+    limit: int = Query(100, ge=1, le=5000),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    All items at one BOM level, ordered by id and paginated with a cursor
+    (pass the returned `next` as `after`; `next` is null on the last page).
+    """
+    Session = await _repo_session(reg, connection_id, api_key)
+    async with Session() as sess:
+        repo = SqlGraphRepository(sess)
+        await _check_engine_filter(repo, dataset_id, engine_id)
+        nodes, total = await repo.nodes_at_level(dataset_id, level, after, limit + 1, engine_id)
+    more = len(nodes) > limit
+    nodes = nodes[:limit]
+    return {
+        "level": level,
+        "total": total,
+        "count": len(nodes),
+        "nodes": nodes,
+        "next": nodes[-1]["id"] if more else None,
+    }
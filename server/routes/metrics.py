@@ -0,0 +1,40 @@
+# server/routes/metrics.py
+from __future__ import annotations
+import os
+from fastapi import APIRouter, Request, HTTPException
+from utils import metrics
+from db.engine_pool import engines
+from utils.admission import scheduler
+from utils.singleflight import flights
+from utils.tree_layout import layouts
+
+router = APIRouter()
+
+_LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost", "testclient"}
+_ALLOW_REMOTE = os.getenv("METRICS_ALLOW_REMOTE", "0") == "1"
+
+def _require_local(request: Request) -> None:
+    host = request.client.host if request.client else None
+    if not _ALLOW_REMOTE and host not in _LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="metrics are only served to local clients")
+
+@router.get("/metrics")
+async def get_metrics(request: Request):
+    """
+    Per-route latency histograms, SQL statements per request, and per-engine
+    statement/DB time and pool checkout wait, plus the engine cache's pools
+    (open/checked-out connections, evictions), admission-control queues and
+    how many graph reads were shared through single-flight coalescing, and
+    the tree-layout cache.
+    Counters are per worker process.
+    """
+    _require_local(request)
+    return {**metrics.snapshot(), "engine_cache": engines.stats(), "admission": scheduler.stats(),
+            "single_flight": flights.stats(), "layout_cache": layouts.stats()}
+
+@router.delete("/metrics")
+async def reset_metrics(request: Request):
+    """Zero all counters (handy before a load test)."""
+    _require_local(request)
+    metrics.reset()
+    return {"message": "metrics reset"}
@@ -0,0 +1,57 @@
+# server/routes/presence.py
+from __future__ import annotations
+import asyncio, os
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Header
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from registry.session import get_registry_session
+from registry.models import DbConnection
+from db.engine_pool import get_engine
+from storage.sql_repository import SqlGraphRepository
+from utils.admission import admit
+
+router = APIRouter()
+
+# Longest one connection may take before it is reported as timed out.
+PRESENCE_TIMEOUT_S = float(os.getenv("PRESENCE_TIMEOUT_S", "10"))
+
+async def _lookup(conn: DbConnection, node_id: str, api_key: Optional[str]) -> dict:
+    out = {"connection_id": conn.id, "connection_name": conn.name}
+    if conn.api_key and api_key != conn.api_key:
+        return {**out, "datasets": [], "error": "invalid API key"}
+    Session = sessionmaker(bind=get_engine(conn.url), class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with Session() as sess:
+            datasets = await asyncio.wait_for(SqlGraphRepository(sess).node_presence(node_id), PRESENCE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        return {**out, "datasets": [], "error": f"timed out after {PRESENCE_TIMEOUT_S:g}s"}
+    except Exception as e:
+        return {**out, "datasets": [], "error": str(e)}
+    return {**out, "datasets": datasets}
+
+@router.get("/presence/{node_id}", dependencies=[Depends(admit("navigation"))])
+async def node_presence(
+    node_id: str,
+    connection_id: Optional[List[int]] = Query(None, description="Only these connections (repeatable); default all"),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    Which datasets, on which registered connections, contain `node_id`, with
+    its in-degree (distinct parents) and out-degree (distinct children) in
+    each. Connections are queried concurrently; a connection that fails,
+    times out or needs a different API key is listed with an `error` instead
+    of failing the whole lookup.
+    """
+    q = select(DbConnection).order_by(DbConnection.id)
+    if connection_id:
+        q = q.where(DbConnection.id.in_(connection_id))
+    conns = list((await reg.execute(q)).scalars())
+    results = await asyncio.gather(*(_lookup(c, node_id, api_key) for c in conns))
+    return {
+        "id": node_id,
+        "datasets": sum(len(r["datasets"]) for r in results),
+        "connections": results,
+    }
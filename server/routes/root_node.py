@@ -7,10 +7,11 @@ from registry.session import get_registry_session
 from registry.api import get_connection
 from db.engine_pool import get_engine
 from storage.sql_repository import SqlGraphRepository
+from utils.admission import admit
 
 router = APIRouter()
 
-@router.get("/root_node")
+@router.get("/root_node", dependencies=[Depends(admit("navigation"))])
 async def get_root_node(
     connection_id: int = Query(..., description="DB connection id"),
     dataset_id: int = Query(..., description="Dataset id within that DB"),
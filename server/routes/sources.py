@@ -1,17 +1,23 @@
 # server/routes/sources.py
 from __future__ import annotations
-from registry.session import set_user_source, get_user_source
 from typing import Optional, Iterable, List
 from fastapi import APIRouter, Depends, Body, HTTPException, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text
 from registry.session import get_registry_session
-from registry.api import list_connections, register_connection, get_connection
+from registry.api import list_connections, register_connection, get_connection, set_user_source, get_user_source
 from registry.models import DbConnection
 from db.engine_pool import get_engine
+from db.schema import bootstrap_graph_db, check_query_plans
+from utils.admission import admit
 from storage.sql_repository import SqlGraphRepository
-from utils.csv_import import DATA_DIR, read_server_csv
+from fastapi.concurrency import run_in_threadpool
+from storage.scoped_import import import_scoped_datasets
+from utils.csv_scan import scan_server_csv
+from utils.csv_import import (
+    list_server_csvs, hash_and_sniff_server_csv, parse_csv_file, ensure_acyclic, normalize_eng_ids, dataset_sha_for, scope_meta,
+)
 
 router = APIRouter()
 
@@ -22,7 +28,7 @@ async def get_sources(reg: AsyncSession = Depends(get_registry_session)):
     """
     # List CSV files
     csvs = []
-    for p in sorted(DATA_DIR.glob("*.csv"), key=lambda x: x.stat().st_mtime, reverse=True):
+    for p in list_server_csvs():
         st = p.stat()
         csvs.append({"name": p.name, "size": st.st_size, "modified_at": int(st.st_mtime)})
 
@@ -65,10 +71,30 @@ async def register_db(
     api_key: Optional[str] = Body(None),
     reg: AsyncSession = Depends(get_registry_session),
 ):
+    # create/upgrade the graph schema first so lookups on this DB never run without their indexes
+    try:
+        schema = await bootstrap_graph_db(get_engine(url))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"could not prepare graph schema: {e}")
     cid = await register_connection(reg, name=name, url=url, api_key=api_key)
-    return {"message": "db connection registered", "connection_id": cid}
+    return {"message": "db connection registered", "connection_id": cid, "schema": schema}
 
-@router.post("/sources/import_csv")
+@router.get("/db/{connection_id}/schema")
+async def db_schema_check(
+    connection_id: int,
+    api_key: Optional[str] = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """EXPLAIN the child/parent lookups on a connection; `degraded` lists ones that would full-scan."""
+    dbrow = await get_connection(reg, connection_id)
+    if not dbrow:
+        raise HTTPException(status_code=404, detail="connection not found")
+    if dbrow.api_key and api_key != dbrow.api_key:
+        raise HTTPException(status_code=401, detail="invalid API key")
+    async with get_engine(dbrow.url).begin() as conn:
+        return {"connection_id": connection_id, **await conn.run_sync(check_query_plans)}
+
+@router.post("/sources/import_csv", dependencies=[Depends(admit("import"))])
 async def import_csv_to_db(
     payload: dict = Body(..., example={"connection_id": 1, "filename": "where_used.csv", "eng_ids": ["MODMAT000001","MODMAT000002"]}),
     api_key: Optional[str] = Header(default=None, alias="x-api-key"),
@@ -77,13 +103,17 @@ async def import_csv_to_db(
     """
     Import a CSV from server data/ into a connection-scoped dataset.
     Optional scoping by one or more eng_id roots using 'eng_id' or 'eng_ids'.
+    With 'dry_run': true nothing is written: the file is scanned and the
+    validation report returned (plus the existing dataset id, if a
+    connection_id is given and the dataset is already imported there).
     """
     conn_id = payload.get("connection_id")
     filename = payload.get("filename")
     one_eng  = payload.get("eng_id")
     many_eng = payload.get("eng_ids")
+    dry_run = bool(payload.get("dry_run"))
 
-    if not conn_id or not filename:
+    if not filename or (not conn_id and not dry_run):
         raise HTTPException(status_code=400, detail="connection_id and filename required")
 
     # Normalize eng_ids param
@@ -95,6 +125,26 @@ async def import_csv_to_db(
     elif isinstance(many_eng, list):
         filter_ids = [str(x).strip() for x in many_eng if str(x).strip()]
 
+    if dry_run:
+        report = await run_in_threadpool(scan_server_csv, filename, filter_ids)
+        if not conn_id:
+            return {"dry_run": True, "filename": filename, **report}
+        dbrow = await get_connection(reg, conn_id)
+        if not dbrow:
+            raise HTTPException(status_code=404, detail="connection not found")
+        if dbrow.api_key and api_key != dbrow.api_key:
+            raise HTTPException(status_code=401, detail="invalid API key")
+        Session = sessionmaker(bind=get_engine(dbrow.url), class_=AsyncSession, expire_on_commit=False)
+        async with Session() as sess:
+            existing = await SqlGraphRepository(sess).get_dataset_by_sha(report["dataset_sha256"])
+        return {
+            "dry_run": True,
+            "filename": filename,
+            "connection_id": conn_id,
+            "existing_dataset_id": existing["dataset_id"] if existing else None,
+            **report,
+        }
+
     # Fetch connection & check API key
     dbrow = await get_connection(reg, conn_id)
     if not dbrow:
@@ -102,24 +152,44 @@ async def import_csv_to_db(
     if dbrow.api_key and api_key != dbrow.api_key:
         raise HTTPException(status_code=401, detail="invalid API key")
 
-    # Read & normalize rows (with optional eng_id filter)
-    dataset_sha, rows, path, meta = read_server_csv(filename, filter_eng_ids=filter_ids)
+    # Hash the raw file first (no parsing) so a re-import returns immediately
+    file_sha, schema, path = await run_in_threadpool(hash_and_sniff_server_csv, filename)
+    meta = scope_meta(schema, normalize_eng_ids(filter_ids))
+    dataset_sha = dataset_sha_for(file_sha, schema, meta["eng_ids"])
 
     # Open a session and insert (dedupe by sha)
     engine = get_engine(dbrow.url)
     Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
     async with Session() as sess:
         repo = SqlGraphRepository(sess)
-        existing = await repo.get_dataset_id_by_sha(dataset_sha)
+        existing = await repo.get_dataset_by_sha(dataset_sha)
         if existing:
             return {
                 "message": "dataset already exists",
-                "dataset_id": existing,
+                "dataset_id": existing["dataset_id"],
                 "sha256": dataset_sha,
-                "rows": len(rows),
+                "rows": existing["rows_loaded"],
                 "filtered": meta.get("filtered", False),
                 "eng_ids": meta.get("eng_ids"),
             }
+
+        # Scoped: a view over the file's base dataset (no copied edges)
+        if meta["filtered"]:
+            [res] = await import_scoped_datasets(
+                repo, original_name=filename, path=path, file_sha=file_sha, scopes=[meta["eng_ids"]]
+            )
+            return {
+                "message": "dataset imported",
+                "dataset_id": res["dataset_id"],
+                "sha256": dataset_sha,
+                "rows": res["rows"],
+                "filtered": True,
+                "eng_ids": meta["eng_ids"],
+            }
+
+        # Read & normalize rows
+        rows, meta = await run_in_threadpool(parse_csv_file, path)
+        ensure_acyclic(meta)
         ds_id = await repo.insert_dataset(
             original_name=filename,
             saved_path=str(path),
@@ -136,6 +206,65 @@ async def import_csv_to_db(
         }
 
 
+@router.post("/sources/import_csv_scopes", dependencies=[Depends(admit("import"))])
+async def import_csv_scopes_to_db(
+    payload: dict = Body(..., example={"connection_id": 1, "filename": "engines.csv", "scopes": ["MODMAT000001", ["MODMAT000002", "MODMAT000003"]]}),
+    api_key: Optional[str] = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    Import one server CSV (new schema) as many eng_id-scoped datasets at once.
+    Each entry of 'scopes' is an eng_id or a list of eng_ids. Scoped datasets
+    are views over the file's base dataset, so the file is hashed once, parsed
+    at most once (only if the base dataset is new), and all missing datasets
+    are created in one transaction. Dataset shas are the same as
+    /sources/import_csv would produce per scope.
+    """
+    conn_id = payload.get("connection_id")
+    filename = payload.get("filename")
+    raw_scopes = payload.get("scopes")
+
+    if not conn_id or not filename:
+        raise HTTPException(status_code=400, detail="connection_id and filename required")
+    if not isinstance(raw_scopes, list) or not raw_scopes:
+        raise HTTPException(status_code=400, detail="'scopes' must be a non-empty list of eng_ids or eng_id lists")
+
+    # Normalize scopes and drop duplicates (same eng_id set -> same dataset)
+    scopes: List[List[str]] = []
+    for item in raw_scopes:
+        ids = normalize_eng_ids(item if isinstance(item, list) else [item])
+        if not ids:
+            raise HTTPException(status_code=400, detail=f"empty scope in 'scopes': {item!r}")
+        if ids not in scopes:
+            scopes.append(ids)
+
+    # Fetch connection & check API key
+    dbrow = await get_connection(reg, conn_id)
+    if not dbrow:
+        raise HTTPException(status_code=404, detail="connection not found")
+    if dbrow.api_key and api_key != dbrow.api_key:
+        raise HTTPException(status_code=401, detail="invalid API key")
+
+    file_sha, schema, path = await run_in_threadpool(hash_and_sniff_server_csv, filename)
+    if schema != "new":
+        raise HTTPException(status_code=400, detail="eng_id scopes require a new-schema CSV")
+
+    engine = get_engine(dbrow.url)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as sess:
+        repo = SqlGraphRepository(sess)
+        results = await import_scoped_datasets(
+            repo, original_name=filename, path=path, file_sha=file_sha, scopes=scopes
+        )
+
+    imported = sum(r["status"] == "imported" for r in results)
+    return {
+        "message": f"{imported} dataset(s) imported, {len(results) - imported} already existed",
+        "filename": filename,
+        "datasets": results,
+    }
+
+
 @router.post("/sources/select")
 async def select_source(
     payload: dict = Body(..., example={"user_id": "u123", "connection_id": 1, "dataset_id": 2}),
@@ -165,14 +294,14 @@ async def select_source(
         if not any(ds["dataset_id"] == dataset_id for ds in datasets):
             raise HTTPException(status_code=404, detail=f"Dataset {dataset_id} not found in connection {connection_id}")
 
-    set_user_source(user_id, connection_id, dataset_id)
+    await set_user_source(reg, user_id, connection_id, dataset_id)
     return {"message": "source selected", "user_id": user_id, "connection_id": connection_id, "dataset_id": dataset_id}
 
 
 @router.get("/sources/active")
 async def get_active_source(user_id: str, reg: AsyncSession = Depends(get_registry_session)):
     """Return the currently active source (connection + dataset) for the given user."""
-    src = get_user_source(user_id)
+    src = await get_user_source(reg, user_id)
     if not src:
         raise HTTPException(status_code=404, detail=f"No active source for user {user_id}")
     return src
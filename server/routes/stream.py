@@ -0,0 +1,145 @@
+# server/routes/stream.py
+from __future__ import annotations
+import asyncio, json, logging
+from typing import Callable, List, Optional
+from fastapi import APIRouter, Depends, Query, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from registry.session import get_registry_session
+from registry.api import get_connection
+from db.engine_pool import get_engine
+from storage.sql_repository import SqlGraphRepository, IN_BATCH
+from utils.admission import scheduler
+
+router = APIRouter()
+log = logging.getLogger("dvp.stream")
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+@router.get("/stream/{root_id}")
+async def stream_subtree(
+    root_id: str,
+    connection_id: int = Query(..., description="DB connection id"),
+    dataset_id: int = Query(..., description="Dataset id within that DB"),
+    budget: int = Query(5000, ge=1, le=1_000_000, description="Stop after sending this many nodes"),
+    max_depth: int = Query(64, ge=0, le=10_000, description="Levels below the root to send"),
+    batch: int = Query(IN_BATCH, ge=1, le=IN_BATCH, description="Parents whose children go in one event"),
+    api_key: str | None = Header(default=None, alias="x-api-key"),
+    reg: AsyncSession = Depends(get_registry_session),
+):
+    """
+    Server-sent events with the subtree under `root_id`, breadth first, in
+    batches as they are read from the database. Events:
+
+    - `meta`: {root, budget, max_depth}
+    - `nodes`: {depth, nodes: [{id, parent, sequence_no}], reused: [[parent, child]]},
+      one per batch of parents; `reused` are edges to parts already sent
+    - `frontier`: {counts: {id: num_children}} for sent nodes whose children were not sent
+    - `done`: {count, depth, reason: "complete" | "budget" | "max_depth"}
+    - `error`: {status, detail} if the walk fails midway
+
+    Closing the connection cancels the walk and its running query.
+    """
+    dbrow = await get_connection(reg, connection_id)
+    if not dbrow:
+        raise HTTPException(status_code=404, detail="connection not found")
+    if dbrow.api_key and api_key != dbrow.api_key:
+        raise HTTPException(status_code=401, detail="invalid API key")
+
+    engine = get_engine(dbrow.url)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as sess:
+        repo = SqlGraphRepository(sess)
+        if not await repo.count_children(dataset_id, [root_id]) and not await repo.get_parent(dataset_id, root_id):
+            raise HTTPException(status_code=404, detail=f"Node {root_id} not found.")
+
+    # the slot is held for the whole stream, not just this handler
+    release = await scheduler.hold("traversal")
+    return StreamingResponse(
+        _bfs_events(Session, dataset_id, root_id, budget, max_depth, batch, release),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _bfs_events(Session, dataset_id: int, root_id: str, budget: int, max_depth: int, batch: int,
+                      release: Callable[[], None]):
+    # The walk runs in its own task and hands events over a small queue. A
+    # client that goes away cancels this generator inside the response's cancel
+    # scope, which would also cancel the driver's cleanup of an interrupted
+    # query; the walk task is instead cancelled once, like any other request.
+    events: asyncio.Queue = asyncio.Queue(maxsize=4)
+    walker = asyncio.create_task(_walk(Session, dataset_id, root_id, budget, max_depth, batch, events))
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+    finally:
+        walker.cancel()
+        release()
+
+async def _walk(Session, dataset_id: int, root_id: str, budget: int, max_depth: int, batch: int,
+                events: asyncio.Queue) -> None:
+    emit = events.put
+    sent, depth, reason = 1, 0, "complete"
+    placed = {root_id}
+    seen_edges = set()
+    unread: List[str] = []  # sent nodes whose children were not (all) sent
+    try:
+        async with Session() as sess:
+            repo = SqlGraphRepository(sess)
+            await emit(_sse("meta", {"root": root_id, "budget": budget, "max_depth": max_depth}))
+            await emit(_sse("nodes", {"depth": 0, "nodes": [{"id": root_id, "parent": None, "sequence_no": 0}], "reused": []}))
+            frontier = [root_id]
+            while frontier:
+                if depth >= max_depth:
+                    reason = "max_depth"
+                    unread.extend(frontier)
+                    break
+                nxt: List[str] = []
+                for i in range(0, len(frontier), batch):
+                    chunk = frontier[i:i + batch]
+                    if sent >= budget:
+                        reason = "budget"
+                        unread.extend(frontier[i:])
+                        break
+                    nodes, reused = [], []
+                    partial: Optional[str] = None
+                    for parent, child, seq in await repo.children_of(dataset_id, chunk):
+                        if (parent, child) in seen_edges:
+                            continue  # same edge recorded at another level
+                        seen_edges.add((parent, child))
+                        if child in placed:
+                            reused.append([parent, child])
+                        elif sent >= budget:
+                            reason = "budget"
+                            if partial != parent:
+                                unread.append(parent)
+                                partial = parent
+                        else:
+                            placed.add(child)
+                            sent += 1
+                            nodes.append({"id": child, "parent": parent, "sequence_no": seq})
+                            nxt.append(child)
+                    if nodes or reused:
+                        await emit(_sse("nodes", {"depth": depth + 1, "nodes": nodes, "reused": reused}))
+                if nxt:
+                    depth += 1
+                if reason == "budget":
+                    unread.extend(nxt)
+                    break
+                frontier = nxt
+
+            if unread:
+                counts = await repo.count_children(dataset_id, list(dict.fromkeys(unread)))
+                if counts:
+                    await emit(_sse("frontier", {"counts": counts}))
+        await emit(_sse("done", {"count": sent, "depth": depth, "reason": reason}))
+    except HTTPException as e:  # e.g. statement timeout (504)
+        await emit(_sse("error", {"status": e.status_code, "detail": e.detail}))
+    except Exception:
+        log.exception("subtree stream failed")
+        await emit(_sse("error", {"status": 500, "detail": "internal error"}))
+    finally:
+        if not asyncio.current_task().cancelling():
+            await emit(None)
@@ -1,21 +1,30 @@
 # server/routes/upload_csv.py
 from __future__ import annotations
 from typing import Optional, List
-from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from registry.session import get_registry_session
 from registry.api import get_connection
 from utils.csv_import import (
-    DATA_DIR,
-    save_bytes_unique,
-    parse_csv_text,
-    sha256_bytes,
-    sha256_text,
+    save_upload_unique,
+    parse_csv_file,
+    ensure_acyclic,
+    sniff_schema,
+    normalize_eng_ids,
+    dataset_sha_for,
+    scope_meta,
+    sniff_header,
+    headers_not_recognized,
 )
+from utils.compression import CodecUnavailable, Decompressor, detect_codec
+from utils.csv_scan import CsvScan
 from db.engine_pool import get_engine
+from utils.admission import admit, scheduler
 from storage.sql_repository import SqlGraphRepository
+from storage.scoped_import import import_scoped_datasets
 
 router = APIRouter()
 
@@ -45,14 +54,10 @@ async def upload_csv(
     If `import_now=true`, it will parse/normalize the CSV and insert it into the
     specified DB connection as a dataset (optionally scoped by eng_id/eng_ids).
     """
-    # ---- Read the uploaded content
-    raw = await file.read()
-    if not raw:
-        raise HTTPException(status_code=400, detail="Empty file")
-
-    # ---- Persist the file under /data (idempotent by name)
-    saved_path = save_bytes_unique(file.filename, raw)
-    file_sha = sha256_bytes(raw)
+    # ---- Stream the upload to /data, hashing while it is written (idempotent by content)
+    saved = await save_upload_unique(file.filename, file)
+    saved_path = saved.path
+    file_sha = saved.sha256
 
     # ---- When not importing now, just return info
     if not import_now:
@@ -60,7 +65,8 @@ async def upload_csv(
             "message": "file uploaded",
             "original_name": file.filename,
             "saved_as": saved_path.name,
-            "size": len(raw),
+            "size": saved.size,
+            "stored_size": saved.stored_size,
             "sha256": file_sha,
             "tip": "Use POST /api/sources/import_csv to import later, or set import_now=true here.",
         }
@@ -79,6 +85,11 @@ async def upload_csv(
         cleaned = [x.strip() for x in eng_ids if x and x.strip()]
         scope_ids = cleaned or None
 
+    # ---- Reject an unrecognized header before touching the DB or parsing the body
+    schema = sniff_schema(saved.head)
+    if schema is None:
+        raise headers_not_recognized(sniff_header(saved.head)[1])
+
     # ---- Fetch connection & verify simple auth
     dbrow = await get_connection(reg, connection_id)
     if not dbrow:
@@ -86,34 +97,46 @@ async def upload_csv(
     if dbrow.api_key and api_key != dbrow.api_key:
         raise HTTPException(status_code=401, detail="invalid API key")
 
-    # ---- Parse/normalize uploaded text directly (no need to re-read from disk)
-    text = raw.decode("utf-8", errors="replace")
-    rows, meta = parse_csv_text(text, filter_eng_ids=scope_ids)
+    # ---- Dataset sha from the file hash + scope (header sniffed, body not parsed yet)
+    meta = scope_meta(schema, normalize_eng_ids(scope_ids))
+    dataset_sha = dataset_sha_for(file_sha, schema, meta["eng_ids"])
 
-    # Build a scope-aware dataset SHA: file_sha | eng_ids
-    if meta.get("filtered") and meta.get("eng_ids"):
-        scope_key = "eng_ids:" + ",".join(meta["eng_ids"])
-        dataset_sha = sha256_text(file_sha + "|" + scope_key)
-    else:
-        dataset_sha = file_sha
-
-    # ---- Insert (or reuse) dataset inside the chosen DB
+    # ---- Insert (or reuse) dataset inside the chosen DB (holding an import slot)
     engine = get_engine(dbrow.url)
     Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
-    async with Session() as sess:
+    async with scheduler.slot("import"), Session() as sess:
         repo = SqlGraphRepository(sess)
-        existing = await repo.get_dataset_id_by_sha(dataset_sha)
+        existing = await repo.get_dataset_by_sha(dataset_sha)
         if existing:
             return {
                 "message": "dataset already exists",
-                "dataset_id": existing,
+                "dataset_id": existing["dataset_id"],
                 "sha256": dataset_sha,
-                "rows": len(rows),
+                "rows": existing["rows_loaded"],
                 "filtered": meta.get("filtered", False),
                 "eng_ids": meta.get("eng_ids"),
                 "saved_as": saved_path.name,
             }
 
+        # ---- Scoped: a view over the file's base dataset (no copied edges)
+        if meta["filtered"]:
+            [res] = await import_scoped_datasets(
+                repo, original_name=file.filename, path=saved_path, file_sha=file_sha, scopes=[meta["eng_ids"]]
+            )
+            return {
+                "message": "dataset imported",
+                "dataset_id": res["dataset_id"],
+                "sha256": dataset_sha,
+                "rows": res["rows"],
+                "filtered": True,
+                "eng_ids": meta["eng_ids"],
+                "saved_as": saved_path.name,
+            }
+
+        # ---- Parse/normalize the saved file only for a new dataset
+        rows, meta = await run_in_threadpool(parse_csv_file, saved_path)
+        ensure_acyclic(meta)
+
         ds_id = await repo.insert_dataset(
             original_name=file.filename,
             saved_path=str(saved_path),
@@ -130,3 +153,45 @@ async def upload_csv(
             "eng_ids": meta.get("eng_ids"),
             "saved_as": saved_path.name,
         }
+
+
+@router.post(
+    "/upload_csv/validate",
+    summary="Validate a CSV without importing it (dry run)",
+    dependencies=[Depends(admit("traversal"))],
+)
+async def validate_csv(
+    request: Request,
+    eng_ids: Optional[List[str]] = Query(None, description="Restrict a new-schema file to these eng_ids"),
+):
+    """
+    Dry run of an import: the raw request body is the CSV (plain, gzip or
+    zstd; not multipart), scanned as it arrives. An unrecognized header is
+    rejected after the first chunk, without reading the rest. Otherwise the
+    response reports schema, row/node/edge counts, duplicates, malformed
+    lines, roots and cycles, and whether an import would be accepted.
+    Nothing is saved or written to any database.
+    """
+    scan = CsvScan(eng_ids)
+    dec: Optional[Decompressor] = None
+    async for chunk in request.stream():
+        if not chunk:
+            continue
+        codec = dec.codec if dec is not None else detect_codec(chunk[:4])
+        try:
+            if dec is None:
+                dec = Decompressor(codec)
+            data = dec.feed(chunk)
+        except CodecUnavailable as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Corrupt {codec} upload: {e}")
+        if data:
+            await run_in_threadpool(scan.feed, data)
+    if dec is None:
+        raise HTTPException(status_code=400, detail="Empty file")
+    try:
+        dec.finish()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Corrupt {dec.codec} upload: {e}")
+    return await run_in_threadpool(scan.finish)
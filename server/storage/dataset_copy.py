@@ -0,0 +1,95 @@
+# server/storage/dataset_copy.py
+from __future__ import annotations
+import asyncio, time
+from typing import AsyncIterator, Dict, List, Optional
+from db.models import Relationship, RelationshipEngine, Ancestry
+from storage.sql_repository import SqlGraphRepository
+
+# per-dataset row tables, in copy order; views own only their ancestry rows
+EDGE_TABLES = (Relationship.__table__, RelationshipEngine.__table__)
+VIEW_TABLES = (Ancestry.__table__,)
+
+# upload_file fields carried over as they are (ids and base_dataset_id are remapped)
+_RECORD_FIELDS = ("original_name", "saved_path", "sha256", "rows_loaded", "scope")
+
+class DatasetNotFound(LookupError):
+    """The source dataset does not exist."""
+
+async def _prefetched(batches: AsyncIterator, depth: int = 2) -> AsyncIterator:
+    """Read ahead up to `depth` batches in a task, so the source read overlaps the target write."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+    done = object()
+
+    async def pump() -> None:
+        try:
+            async for item in batches:
+                await queue.put(item)
+            await queue.put(done)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(pump())
+    try:
+        while (item := await queue.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+async def copy_dataset(src: SqlGraphRepository, dst: SqlGraphRepository, dataset_id: int) -> AsyncIterator[Dict]:
+    """
+    Copy a dataset from one database to another, yielding progress events.
+
+    Rows are read per table with one server-side cursor each and written in
+    bulk batches, so the cost is a sequential read plus a bulk insert; nothing
+    is re-parsed and the ancestry index is copied, not rebuilt. The copy keeps
+    the dataset sha, so a dataset the target already has (same sha) is not
+    copied again. A scoped view brings its base dataset along (unless the
+    target has it) and stays a view there. Everything is written in one
+    target transaction, committed at the end.
+
+    Events: {"event": "progress", "sha256", "table", "rows", "total"} after
+    each batch, then one {"event": "done", "status": "copied" | "exists",
+    "dataset_id", "sha256", "rows": {table: n}, "elapsed_ms"}.
+    """
+    t0 = time.perf_counter()
+    rec = await src.dataset_record(dataset_id)
+    if rec is None:
+        raise DatasetNotFound(dataset_id)
+    existing = await dst.get_dataset_id_by_sha(rec["sha256"])
+    if existing is not None:
+        yield {"event": "done", "status": "exists", "dataset_id": existing, "sha256": rec["sha256"],
+               "rows": {}, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        return
+
+    chain: List[dict] = [rec]
+    if rec["base_dataset_id"] is not None:
+        chain.insert(0, await src.dataset_record(rec["base_dataset_id"]))
+
+    copied: Dict[str, int] = {}
+    target_id: Optional[int] = None
+    for r in chain:
+        is_view = r["base_dataset_id"] is not None
+        if r is not rec:
+            target_id = await dst.get_dataset_id_by_sha(r["sha256"])
+            if target_id is not None:
+                continue  # the view's base is already there
+        fields = {k: r[k] for k in _RECORD_FIELDS}
+        fields["base_dataset_id"] = target_id if is_view else None
+        target_id = await dst.add_dataset_record(**fields)
+        for table in (VIEW_TABLES if is_view else EDGE_TABLES + VIEW_TABLES):
+            total = await src.count_rows(table, r["id"])
+            done = 0
+            async for rows in _prefetched(src.stream_rows(table, r["id"])):
+                await dst.append_rows(table, target_id, rows)
+                done += len(rows)
+                yield {"event": "progress", "sha256": r["sha256"], "table": table.name, "rows": done, "total": total}
+            copied[table.name] = copied.get(table.name, 0) + done
+    await dst.commit()
+    yield {"event": "done", "status": "copied", "dataset_id": target_id, "sha256": rec["sha256"],
+           "rows": copied, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
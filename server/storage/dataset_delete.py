@@ -0,0 +1,129 @@
+# server/storage/dataset_delete.py
+from __future__ import annotations
+import asyncio, contextvars, logging, os, time
+from typing import Dict, List, Set
+from sqlalchemy.ext.asyncio import AsyncEngine
+from db.models import Relationship, RelationshipEngine, Ancestry
+from storage.sql_repository import SqlGraphRepository
+
+log = logging.getLogger("dvp.delete")
+
+DELETE_BATCH = int(os.getenv("DELETE_BATCH", "5000"))            # rows per DELETE statement/transaction
+VACUUM_STEP_PAGES = int(os.getenv("VACUUM_STEP_PAGES", "2000"))  # pages freed per incremental_vacuum step
+VACUUM_PAUSE_S = float(os.getenv("VACUUM_PAUSE_S", "0.05"))      # pause between steps (lets writers in)
+
+TOMBSTONE = "deleting:"  # a deleted dataset's sha becomes deleting:<id>:<sha>
+
+def _live_sha(sha: str) -> str:
+    return sha.split(":", 2)[2] if sha.startswith(TOMBSTONE) else sha
+
+# (table, range key): each key follows dataset_id in an index of its table
+# (ix_rel_dataset_parent_seq and the primary keys), so a batch is one index range
+ROW_TABLES = (
+    (Ancestry.__table__, "descendant"),
+    (RelationshipEngine.__table__, "parent_item"),
+    (Relationship.__table__, "parent_item"),
+)
+
+class DatasetInUse(Exception):
+    """Scoped views read the dataset's edges; delete them first (or cascade)."""
+    def __init__(self, views: List[int]):
+        super().__init__(f"dataset is the base of views {views}")
+        self.views = views
+
+async def delete_dataset(repo: SqlGraphRepository, dataset_id: int, cascade: bool = False) -> Dict:
+    """
+    Delete a dataset (and, with cascade, the scoped views over it) in small
+    committed batches, so readers and other writers get the database between
+    them. The shas are tombstoned first, so the file can be imported again
+    right away. If the deletion stops midway, calling it again removes the
+    rest. The upload_file rows go last. Returns counts per table.
+    """
+    t0 = time.perf_counter()
+    rec = await repo.dataset_record(dataset_id)
+    if rec is None:
+        raise LookupError(dataset_id)
+    views = await repo.dependent_views(dataset_id)
+    if views and not cascade:
+        raise DatasetInUse(views)
+    ids = views + [dataset_id]
+    sha = _live_sha(rec["sha256"])
+    view_shas = [_live_sha((await repo.dataset_record(v))["sha256"]) for v in views]
+    await repo.tombstone_datasets(ids, TOMBSTONE)
+
+    deleted = {table.name: 0 for table, _ in ROW_TABLES}
+    batches = 0
+    for ds_id in ids:
+        for table, key in ROW_TABLES:
+            more = True
+            while more:
+                n, more = await repo.delete_rows_batch(table, key, ds_id, DELETE_BATCH)
+                deleted[table.name] += n
+                batches += 1
+    deleted["upload_file"] = await repo.delete_dataset_records(ids)
+
+    dropped = repo.forget_layouts([sha, *view_shas])
+    log.info("dataset %s deleted (%s views) in %s batches: %s", dataset_id, len(views), batches, deleted)
+    return {
+        "dataset_id": dataset_id,
+        "sha256": sha,
+        "views_deleted": views,
+        "deleted": deleted,
+        "batches": batches,
+        "layouts_dropped": dropped,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+# ---------------------------------------------------------------------
+# space reclamation
+# ---------------------------------------------------------------------
+_vacuums: Set[asyncio.Task] = set()
+_vacuuming: Set[str] = set()
+
+async def _scalar(engine: AsyncEngine, sql: str):
+    async with engine.connect() as conn:
+        return (await conn.exec_driver_sql(sql)).scalar()
+
+async def _incremental_vacuum(engine: AsyncEngine, label: str) -> None:
+    # small steps, each its own write transaction, until the freelist is empty
+    try:
+        freed = 0
+        while (free := await _scalar(engine, "PRAGMA freelist_count")):
+            async with engine.connect() as conn:
+                # the pragma frees one page per step, and execute() steps a
+                # statement without result columns only once: run it as a script
+                raw = (await conn.get_raw_connection()).driver_connection
+                await raw.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES});")
+            freed += min(free, VACUUM_STEP_PAGES)
+            await asyncio.sleep(VACUUM_PAUSE_S)
+        async with engine.connect() as conn:
+            (await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")).fetchall()
+        log.info("%s: incremental vacuum gave back %s pages", label, freed)
+    except Exception:
+        log.exception("%s: incremental vacuum failed", label)
+    finally:
+        _vacuuming.discard(label)
+
+async def reclaim_space(engine: AsyncEngine) -> Dict:
+    """
+    Give pages freed by a deletion back to the filesystem where the backend
+    allows it without blocking. SQLite files in auto_vacuum=INCREMENTAL mode
+    (every file this server creates) are shrunk by a background task in small
+    steps; older files keep the free pages for later imports (a full VACUUM,
+    offline, shrinks them). Server databases leave it to their own vacuum.
+    """
+    if engine.dialect.name != "sqlite":
+        return {"mode": "server", "detail": "space is reclaimed by the database's own (auto)vacuum"}
+    mode = await _scalar(engine, "PRAGMA auto_vacuum")
+    free = await _scalar(engine, "PRAGMA freelist_count")
+    if mode != 2:
+        return {"mode": "reuse", "free_pages": free,
+                "detail": "auto_vacuum is off for this file: free pages are reused by later imports; VACUUM shrinks it"}
+    label = engine.url.render_as_string(hide_password=True)
+    if free and label not in _vacuuming:
+        _vacuuming.add(label)
+        # own context: the background task must not inherit this request's cancellation/timeout state
+        task = asyncio.create_task(_incremental_vacuum(engine, label), context=contextvars.Context())
+        _vacuums.add(task)
+        task.add_done_callback(_vacuums.discard)
+    return {"mode": "incremental", "free_pages": free, "scheduled": bool(free)}
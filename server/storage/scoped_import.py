@@ -0,0 +1,56 @@
+# server/storage/scoped_import.py
+from __future__ import annotations
+from pathlib import Path
+from typing import List, Dict
+from fastapi.concurrency import run_in_threadpool
+from storage.sql_repository import SqlGraphRepository
+from utils.csv_import import dataset_sha_for, parse_csv_file, ensure_acyclic
+
+async def import_scoped_datasets(
+    repo: SqlGraphRepository,
+    *,
+    original_name: str,
+    path: Path,
+    file_sha: str,
+    scopes: List[List[str]],
+) -> List[Dict]:
+    """
+    Create eng_id-scoped datasets of a new-schema CSV as views over the file's
+    base (unscoped) dataset instead of copying edges per scope.
+
+    The base dataset is imported first if it doesn't exist. If it was imported
+    before edge provenance was recorded, the file is parsed once to backfill it.
+    Everything missing is created in one transaction. `scopes` must already be
+    normalized (see normalize_eng_ids). Returns one result per scope.
+    """
+    shas = [dataset_sha_for(file_sha, "new", ids) for ids in scopes]
+    known = await repo.get_datasets_by_shas([file_sha, *shas])
+    missing = [i for i, sha in enumerate(shas) if sha not in known]
+
+    created: Dict[str, Dict] = {}
+    if missing:
+        base = known.get(file_sha)
+        if base is None or not await repo.has_engine_index(base["dataset_id"]):
+            rows, meta = await run_in_threadpool(parse_csv_file, path)
+            if base is None:
+                ensure_acyclic(meta)
+                ds = await repo.add_dataset(original_name, str(path), file_sha, rows)
+                base = {"dataset_id": ds.id, "rows_loaded": ds.rows_loaded}
+            else:
+                await repo.backfill_engine_index(base["dataset_id"], rows)
+        for i in missing:
+            view = await repo.add_scoped_view(base["dataset_id"], original_name, str(path), shas[i], scopes[i])
+            created[shas[i]] = {"dataset_id": view.id, "rows_loaded": view.rows_loaded}
+        await repo.commit()
+
+    results = []
+    for ids, sha in zip(scopes, shas):
+        hit = known.get(sha) or created[sha]
+        results.append({
+            "eng_ids": ids,
+            "status": "exists" if sha in known else "imported",
+            "dataset_id": hit["dataset_id"],
+            "sha256": sha,
+            "rows": hit["rows_loaded"],
+        })
+    return results
@@ -1,13 +1,98 @@
 # server/storage/sql_repository.py
 from __future__ import annotations
-from typing import Iterable, Optional, List, Dict
-from sqlalchemy import select, func, insert
+import functools, inspect, logging, os
+from typing import Iterable, Optional, List, Dict, Sequence, Tuple
+from sqlalchemy import select, func, insert, exists, false, delete, update, and_, literal, cast, String
+from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.models import UploadFile, Relationship
+from fastapi.concurrency import run_in_threadpool
+from db.models import UploadFile, Relationship, RelationshipEngine, Ancestry
+from utils import singleflight
+from utils.bom import explode
+from utils.tree_layout import LayoutParams, layout, layouts
+from utils.ancestry import closure, ClosureTooLarge, CyclicGraph
+
+INSERT_BATCH = 5_000  # rows per executemany when bulk-inserting edges
+IN_BATCH = 500        # ids per IN (...) when fetching many nodes' children
+MAX_PATH_DEPTH = int(os.getenv("TRAVERSAL_MAX_DEPTH", "1000"))  # hard stop for upward walks
+ANCESTRY_ON_IMPORT = os.getenv("ANCESTRY_INDEX", "0") == "1"        # build the ancestry index at ingest (opt-in)
+ANCESTRY_MAX_ROWS = int(os.getenv("ANCESTRY_MAX_ROWS", "10000000"))  # skip the index past this many pairs
+
+log = logging.getLogger("dvp.import")
+
+def coalesced(method):
+    """
+    Share one in-flight query between concurrent identical reads.
+
+    The key is (database, dataset sha, method, arguments): the sha names the
+    dataset's content, so a dataset id reused after a delete/re-import never
+    picks up a stale in-flight answer. Unknown datasets are not coalesced.
+    """
+    sig = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def wrapper(self, dataset_id: int, *args, **kwargs):
+        sha = await self._dataset_sha(dataset_id) if singleflight.ENABLED else None
+        if sha is None:
+            return await method(self, dataset_id, *args, **kwargs)
+        bound = sig.bind(self, dataset_id, *args, **kwargs)
+        bound.apply_defaults()
+        key = (self._db_key(), sha, method.__name__, tuple(bound.arguments.values())[2:])
+        return await singleflight.flights.do(key, lambda: method(self, dataset_id, *args, **kwargs))
+    return wrapper
 
 class SqlGraphRepository:
     def __init__(self, session: AsyncSession):
         self._db = session
+        self._scopes: Dict[int, Tuple[int, Optional[List[str]]]] = {}
+        self._shas: Dict[int, Optional[str]] = {}
+
+    # ---- dataset scoping -------------------------------------------
+    async def _resolve(self, dataset_id: int) -> Tuple[int, Optional[List[str]]]:
+        """(dataset whose edges to read, engine_ids filter or None) for a dataset id."""
+        hit = self._scopes.get(dataset_id)
+        if hit is None:
+            res = await self._db.execute(
+                select(UploadFile.base_dataset_id, UploadFile.scope, UploadFile.sha256).where(UploadFile.id == dataset_id)
+            )
+            row = res.first()
+            if row is None or row.base_dataset_id is None:
+                hit = (dataset_id, None)
+            else:
+                hit = (row.base_dataset_id, row.scope.split(","))
+            self._scopes[dataset_id] = hit
+            self._shas[dataset_id] = row.sha256 if row is not None else None
+        return hit
+
+    async def _dataset_sha(self, dataset_id: int) -> Optional[str]:
+        if dataset_id not in self._shas:
+            await self._resolve(dataset_id)
+        return self._shas[dataset_id]
+
+    def _db_key(self) -> str:
+        return self._db.bind.url.render_as_string(hide_password=False)
+
+    @staticmethod
+    def _edge_filter(base_id: int, engine_ids: Optional[List[str]], rel=Relationship):
+        """WHERE clause selecting a dataset's edges (restricted to engine_ids for views); `rel` may be an alias."""
+        cond = rel.dataset_id == base_id
+        if engine_ids:
+            cond = cond & exists().where(
+                (RelationshipEngine.dataset_id == rel.dataset_id)
+                & (RelationshipEngine.parent_item == rel.parent_item)
+                & (RelationshipEngine.child_item == rel.child_item)
+                & RelationshipEngine.engine_id.in_(engine_ids)
+            )
+        return cond
+
+    async def _edges(self, dataset_id: int, engine_id: Optional[str] = None, rel=Relationship):
+        """A dataset's edges, optionally only those a given engine's rows produced."""
+        base_id, scope = await self._resolve(dataset_id)
+        if engine_id is not None:
+            if scope and engine_id not in scope:
+                return false()  # outside the view's scope
+            scope = [engine_id]
+        return self._edge_filter(base_id, scope, rel)
 
     async def list_datasets(self) -> list[dict]:
         res = await self._db.execute(select(UploadFile).order_by(UploadFile.created_at.desc()))
@@ -19,15 +104,83 @@ class SqlGraphRepository:
                 "sha256": ds.sha256,
                 "rows_loaded": ds.rows_loaded,
                 "created_at": str(ds.created_at) if ds.created_at else None,
+                "base_dataset_id": ds.base_dataset_id,
+                "eng_ids": ds.scope.split(",") if ds.scope else None,
             }
             for ds in res.scalars()
         ]
 
+    async def node_presence(self, node_id: str) -> List[dict]:
+        """
+        Every dataset in this database that contains node_id, with its in-degree
+        (distinct parents) and out-degree (distinct children) there. Scoped views
+        count only the edges their engines produced.
+        """
+        degrees: Dict[int, List[int]] = {}
+        for side, (match, other) in enumerate((
+            (Relationship.child_item, Relationship.parent_item),
+            (Relationship.parent_item, Relationship.child_item),
+        )):
+            q = (
+                select(Relationship.dataset_id, func.count(other.distinct()))
+                .where(match == node_id)
+                .group_by(Relationship.dataset_id)
+            )
+            for ds_id, n in (await self._db.execute(q)).all():
+                degrees.setdefault(ds_id, [0, 0])[side] = n
+        if not degrees:
+            return []
+
+        q = select(UploadFile).where(UploadFile.id.in_(degrees) | UploadFile.base_dataset_id.in_(degrees))
+        out = []
+        for ds in (await self._db.execute(q)).scalars():
+            if ds.base_dataset_id is None:
+                n_in, n_out = degrees[ds.id]
+            else:
+                edges = self._edge_filter(ds.base_dataset_id, ds.scope.split(","))
+                q = select(
+                    select(func.count(Relationship.parent_item.distinct()))
+                    .where(edges & (Relationship.child_item == node_id)).scalar_subquery(),
+                    select(func.count(Relationship.child_item.distinct()))
+                    .where(edges & (Relationship.parent_item == node_id)).scalar_subquery(),
+                )
+                n_in, n_out = (await self._db.execute(q)).one()
+                if not n_in and not n_out:
+                    continue  # the base has the node, but not within this view's engines
+            out.append({
+                "dataset_id": ds.id,
+                "original_name": ds.original_name,
+                "sha256": ds.sha256,
+                "base_dataset_id": ds.base_dataset_id,
+                "eng_ids": ds.scope.split(",") if ds.scope else None,
+                "in_degree": n_in,
+                "out_degree": n_out,
+            })
+        out.sort(key=lambda d: d["dataset_id"])
+        return out
+
     async def get_dataset_id_by_sha(self, sha256: str) -> Optional[int]:
         res = await self._db.execute(select(UploadFile.id).where(UploadFile.sha256 == sha256).limit(1))
         return res.scalar_one_or_none()
 
-    async def insert_dataset(self, original_name: str, saved_path: str, sha256: str, rows: List[Dict]) -> int:
+    async def get_dataset_by_sha(self, sha256: str) -> Optional[dict]:
+        res = await self._db.execute(
+            select(UploadFile.id, UploadFile.rows_loaded).where(UploadFile.sha256 == sha256).limit(1)
+        )
+        row = res.first()
+        return {"dataset_id": row.id, "rows_loaded": row.rows_loaded} if row else None
+
+    async def get_datasets_by_shas(self, shas: Iterable[str]) -> Dict[str, dict]:
+        shas = list(shas)
+        if not shas:
+            return {}
+        res = await self._db.execute(
+            select(UploadFile.id, UploadFile.sha256, UploadFile.rows_loaded).where(UploadFile.sha256.in_(shas))
+        )
+        return {r.sha256: {"dataset_id": r.id, "rows_loaded": r.rows_loaded} for r in res}
+
+    async def add_dataset(self, original_name: str, saved_path: str, sha256: str, rows: List[Dict]) -> UploadFile:
+        """Insert a dataset and its edges (plus engine provenance). Flushes but does not commit."""
         # Create dataset row
         ds = UploadFile(
             original_name=original_name,
@@ -51,27 +204,211 @@ class SqlGraphRepository:
             for r in rows
         ]
 
-        if payload:
-            stmt = insert(Relationship)
-            await self._db.execute(stmt, payload)
+        await self._insert_batched(Relationship, payload)
+        await self._add_engine_index(ds.id, rows)
+        if ANCESTRY_ON_IMPORT:
+            await self.build_ancestry(ds.id, ([r["parent_item"] for r in rows], [r["child_item"] for r in rows]))
 
         ds.rows_loaded = len(payload)
+        return ds
+
+    async def _add_engine_index(self, dataset_id: int, rows: List[Dict]) -> int:
+        """Insert edge->engine provenance for new-schema rows (rows carry 'engine_ids')."""
+        payload = [
+            {"dataset_id": dataset_id, "parent_item": r["parent_item"], "child_item": r["child_item"], "engine_id": e}
+            for r in rows
+            for e in (r.get("engine_ids") or ())
+        ]
+        await self._insert_batched(RelationshipEngine, payload)
+        return len(payload)
+
+    async def _insert_batched(self, model, payload: List[Dict]) -> None:
+        # executemany in slices: each await hands the event loop back to readers
+        stmt = insert(model)
+        for i in range(0, len(payload), INSERT_BATCH):
+            await self._db.execute(stmt, payload[i:i + INSERT_BATCH])
+
+    async def _insert_rows(self, table, columns: Sequence[str], rows: Sequence[tuple]) -> None:
+        # Like _insert_batched but for millions of plain tuples: the INSERT is
+        # compiled once and rows go straight to the driver's executemany,
+        # skipping per-row parameter processing (about 4x faster on SQLite).
+        conn = await self._db.connection()
+        compiled = insert(table).compile(dialect=conn.dialect, column_keys=list(columns))
+        if compiled.positional:
+            pos = [columns.index(k) for k in compiled.positiontup]
+            shape = (lambda r: tuple(r[i] for i in pos)) if pos != list(range(len(columns))) else tuple
+        else:
+            shape = lambda r: dict(zip(columns, r))
+        batch = INSERT_BATCH * 10
+        for i in range(0, len(rows), batch):
+            await conn.exec_driver_sql(str(compiled), [shape(r) for r in rows[i:i + batch]])
+
+    async def has_engine_index(self, dataset_id: int) -> bool:
+        res = await self._db.execute(
+            select(RelationshipEngine.engine_id).where(RelationshipEngine.dataset_id == dataset_id).limit(1)
+        )
+        return res.first() is not None
+
+    async def supports_engine_filter(self, dataset_id: int) -> bool:
+        """Whether edge provenance exists for the dataset's edges (needed for engine_id filters)."""
+        base_id, _ = await self._resolve(dataset_id)
+        return await self.has_engine_index(base_id)
+
+    async def backfill_engine_index(self, dataset_id: int, rows: List[Dict]) -> int:
+        """Add provenance to a dataset imported before it was recorded (no commit)."""
+        return await self._add_engine_index(dataset_id, rows)
+
+    async def add_scoped_view(
+        self, base_dataset_id: int, original_name: str, saved_path: str, sha256: str, eng_ids: List[str]
+    ) -> UploadFile:
+        """
+        Create a dataset that reads base_dataset_id's edges filtered to eng_ids.
+        No relationship rows are copied. Flushes but does not commit.
+        """
+        count = await self._db.execute(
+            select(func.count()).select_from(Relationship).where(self._edge_filter(base_dataset_id, eng_ids))
+        )
+        ds = UploadFile(
+            original_name=original_name,
+            saved_path=saved_path,
+            sha256=sha256,
+            rows_loaded=count.scalar() or 0,
+            is_active=False,
+            base_dataset_id=base_dataset_id,
+            scope=",".join(eng_ids),
+        )
+        self._db.add(ds)
+        await self._db.flush()
+        if ANCESTRY_ON_IMPORT:
+            await self.build_ancestry(ds.id)
+        return ds
+
+    # ---- bulk row transfer (dataset copies) ---------------------------
+    async def dataset_record(self, dataset_id: int) -> Optional[dict]:
+        """A dataset's upload_file row as a dict (None if missing)."""
+        ds = await self._db.get(UploadFile, dataset_id)
+        if ds is None:
+            return None
+        return {c.key: getattr(ds, c.key) for c in UploadFile.__table__.columns}
+
+    async def add_dataset_record(self, **fields) -> int:
+        """Insert an upload_file row as given (no edges, no ancestry). Flushes but does not commit."""
+        ds = UploadFile(is_active=False, **fields)
+        self._db.add(ds)
+        await self._db.flush()
+        return ds.id
+
+    @staticmethod
+    def row_columns(table) -> List[str]:
+        """The columns a copy carries for `table`: everything but dataset_id and surrogate ids."""
+        return [c.name for c in table.columns if c.name != "dataset_id" and c is not table.autoincrement_column]
+
+    async def count_rows(self, table, dataset_id: int) -> int:
+        res = await self._db.execute(select(func.count()).select_from(table).where(table.c.dataset_id == dataset_id))
+        return res.scalar() or 0
+
+    async def stream_rows(self, table, dataset_id: int, batch: int = INSERT_BATCH * 10):
+        """
+        A dataset's rows of `table` (row_columns order) in lists of up to
+        `batch`, read with one server-side cursor in primary-key order.
+        """
+        cols = [table.c[name] for name in self.row_columns(table)]
+        q = (
+            select(*cols)
+            .where(table.c.dataset_id == dataset_id)
+            .order_by(*table.primary_key.columns)
+            .execution_options(yield_per=batch)
+        )
+        result = await self._db.stream(q)
+        try:
+            async for part in result.partitions(batch):
+                yield part
+        finally:
+            await result.close()
+
+    async def append_rows(self, table, dataset_id: int, rows: Sequence[tuple]) -> None:
+        """Bulk-insert rows (row_columns order) of `table` under dataset_id. No commit."""
+        columns = ["dataset_id", *self.row_columns(table)]
+        await self._insert_rows(table, columns, [(dataset_id, *r) for r in rows])
+
+    # ---- batched deletion ----------------------------------------------
+    async def dependent_views(self, dataset_id: int) -> List[int]:
+        res = await self._db.execute(select(UploadFile.id).where(UploadFile.base_dataset_id == dataset_id))
+        return list(res.scalars())
+
+    async def tombstone_datasets(self, dataset_ids: List[int], prefix: str) -> None:
+        """
+        Prefix the datasets' shas with `<prefix><id>:` (once) and commit: their
+        content no longer dedupes or coalesces, so the same file can be
+        imported again at once. The id keeps the tombstone unique when a
+        re-import of that file is deleted while the first is unfinished.
+        """
+        await self._db.execute(
+            update(UploadFile)
+            .where(UploadFile.id.in_(dataset_ids) & ~UploadFile.sha256.startswith(prefix))
+            .values(sha256=literal(prefix) + cast(UploadFile.id, String) + literal(":") + UploadFile.sha256)
+        )
+        await self._db.commit()
+        for ds_id in dataset_ids:
+            self._scopes.pop(ds_id, None)
+            self._shas.pop(ds_id, None)
+
+    async def delete_rows_batch(self, table, key: str, dataset_id: int, batch: int) -> Tuple[int, bool]:
+        """
+        Delete about `batch` of a dataset's rows of `table` and commit; returns
+        (rows deleted, whether any are left). Rows go by ranges of `key`, the
+        column after dataset_id in one of the table's indexes, so each batch
+        is an index range and no row ids are collected. All rows of one key
+        value go together, even if they are more than `batch`.
+        """
+        k, mine = table.c[key], table.c.dataset_id == dataset_id
+        cutoff = (await self._db.execute(
+            select(k).where(mine).order_by(k).offset(batch).limit(1)
+        )).scalar_one_or_none()
+        if cutoff is None:
+            cond, more = mine, False
+        else:
+            first = (await self._db.execute(select(k).where(mine).order_by(k).limit(1))).scalar_one()
+            cond, more = mine & ((k < cutoff) if first != cutoff else (k == cutoff)), True
+        res = await self._db.execute(delete(table).where(cond))
+        await self._db.commit()
+        return res.rowcount or 0, more
+
+    def forget_layouts(self, shas: Iterable[str]) -> int:
+        """Drop cached layouts of these dataset shas on this database. Returns how many."""
+        return sum(layouts.invalidate(self._db_key(), sha) for sha in shas)
+
+    async def delete_dataset_records(self, dataset_ids: List[int]) -> int:
+        """Delete upload_file rows (Core DELETE: the ORM cascade would load every edge first) and commit."""
+        res = await self._db.execute(delete(UploadFile).where(UploadFile.id.in_(dataset_ids)))
+        await self._db.commit()
+        return res.rowcount or 0
+
+    async def commit(self) -> None:
+        await self._db.commit()
+
+    async def insert_dataset(self, original_name: str, saved_path: str, sha256: str, rows: List[Dict]) -> int:
+        ds = await self.add_dataset(original_name, saved_path, sha256, rows)
         await self._db.commit()
         return ds.id
 
+    @coalesced
     async def list_roots(self, dataset_id: int) -> list[str]:
-        parents = select(Relationship.parent_item).where(Relationship.dataset_id == dataset_id).subquery()
-        children = select(Relationship.child_item).where(Relationship.dataset_id == dataset_id).subquery()
+        edges = await self._edges(dataset_id)
+        parents = select(Relationship.parent_item).where(edges).subquery()
+        children = select(Relationship.child_item).where(edges).subquery()
         q = select(func.distinct(parents.c.parent_item)).where(
             ~parents.c.parent_item.in_(select(children.c.child_item))
         ).order_by(parents.c.parent_item.asc())
         res = await self._db.execute(q)
         return [r[0] for r in res.fetchall()]
 
+    @coalesced
     async def get_children(self, dataset_id: int, parent_id: str, limit: int | None = None) -> list[dict]:
+        edges = await self._edges(dataset_id)
         q = (
             select(Relationship.child_item, Relationship.sequence_no, Relationship.level)
-            .where((Relationship.dataset_id == dataset_id) & (Relationship.parent_item == parent_id))
+            .where(edges & (Relationship.parent_item == parent_id))
             .order_by(Relationship.sequence_no.asc())
         )
         if limit:
@@ -87,7 +424,7 @@ class SqlGraphRepository:
         for row in rows:
             # Check if this child has children
             check_q = select(func.count()).select_from(Relationship).where(
-                (Relationship.dataset_id == dataset_id) & 
+                edges & 
                 (Relationship.parent_item == row.child_item)
             )
             count_res = await self._db.execute(check_q)
@@ -103,10 +440,12 @@ class SqlGraphRepository:
         
         return result
 
+    @coalesced
     async def get_parent(self, dataset_id: int, node_id: str) -> Optional[dict]:
+        edges = await self._edges(dataset_id)
         q = (
             select(Relationship.parent_item, Relationship.sequence_no, Relationship.level)
-            .where((Relationship.dataset_id == dataset_id) & (Relationship.child_item == node_id))
+            .where(edges & (Relationship.child_item == node_id))
             .order_by(Relationship.level.asc(), Relationship.sequence_no.asc())
         )
         res = await self._db.execute(q)
@@ -119,7 +458,7 @@ class SqlGraphRepository:
             # Get the parent's own parent data
             q2 = (
                 select(Relationship.sequence_no, Relationship.level)
-                .where((Relationship.dataset_id == dataset_id) & (Relationship.child_item == parent_id))
+                .where(edges & (Relationship.child_item == parent_id))
                 .limit(1)
             )
             res2 = await self._db.execute(q2)
@@ -144,10 +483,11 @@ class SqlGraphRepository:
         return parents
 
 
+    @coalesced
     async def find_path_to_child(self, dataset_id: int, child_id: str) -> dict:
         # Fetch all parent-child relationships for the given dataset
         q = select(Relationship.parent_item, Relationship.child_item).where(
-            Relationship.dataset_id == dataset_id
+            await self._edges(dataset_id)
         )
         res = await self._db.execute(q)
         rows = res.fetchall()
@@ -159,11 +499,21 @@ class SqlGraphRepository:
         if child_id not in parent_map and all(child_id != p for p, c in rows):
             return {"path": []}
 
-        # Reconstruct path from child up to root
+        # Reconstruct path from child up to root. A cycle in the data (or an
+        # absurdly deep chain) stops the walk instead of spinning forever.
         path = [child_id]
+        seen = {child_id}
         current = child_id
+        stopped = None
         while current in parent_map:
             parent = parent_map[current]
+            if parent in seen:
+                stopped = {"reason": "cycle", "node": parent}
+                break
+            if len(path) >= MAX_PATH_DEPTH:
+                stopped = {"reason": "max_depth", "node": parent}
+                break
+            seen.add(parent)
             path.append(parent)
             current = parent
 
@@ -186,8 +536,293 @@ class SqlGraphRepository:
                     "child_name": ""
                 })
 
+        if stopped:
+            return {"path": structured_path, "truncated": stopped}
         return {"path": structured_path}
 
+    async def edge_pairs(self, dataset_id: int) -> Tuple[List[str], List[str]]:
+        """Distinct (parents, children) of a dataset as two parallel lists."""
+        q = (
+            select(Relationship.parent_item, Relationship.child_item)
+            .where(await self._edges(dataset_id))
+            .distinct()
+            .execution_options(yield_per=INSERT_BATCH)
+        )
+        # read in partitions so a large dataset does not hold the event loop while rows are built
+        parents: List[str] = []
+        children: List[str] = []
+        result = await self._db.stream(q)
+        try:
+            async for part in result.partitions():
+                parents.extend(r[0] for r in part)
+                children.extend(r[1] for r in part)
+        finally:
+            await result.close()
+        return parents, children
+
+    @coalesced
+    async def explode(self, dataset_id: int, root_id: str) -> Tuple[List[dict], bool]:
+        """
+        Occurrence roll-up of every descendant of root_id (see utils.bom.explode),
+        most frequent first. Raises utils.bom.CyclicSubtree on a reachable cycle.
+        """
+        parents, children = await self.edge_pairs(dataset_id)
+
+        def run():
+            items, exact = explode(parents, children, root_id)
+            items.sort(key=lambda x: (-x["occurrences"], x["id"]))
+            return items, exact
+
+        return await run_in_threadpool(run)
+
+    async def children_of(self, dataset_id: int, parent_ids: List[str]) -> List[Tuple[str, str, int]]:
+        """(parent, child, sequence_no) for many parents, ordered by parent then sequence_no."""
+        edges = await self._edges(dataset_id)
+        out: List[Tuple[str, str, int]] = []
+        for i in range(0, len(parent_ids), IN_BATCH):
+            q = (
+                select(Relationship.parent_item, Relationship.child_item, Relationship.sequence_no)
+                .where(edges & Relationship.parent_item.in_(parent_ids[i:i + IN_BATCH]))
+                .order_by(Relationship.parent_item.asc(), Relationship.sequence_no.asc())
+            )
+            out.extend(tuple(r) for r in (await self._db.execute(q)).all())
+        return out
+
+    async def count_children(self, dataset_id: int, parent_ids: List[str]) -> Dict[str, int]:
+        """Number of distinct children per parent (parents without children are omitted)."""
+        edges = await self._edges(dataset_id)
+        out: Dict[str, int] = {}
+        for i in range(0, len(parent_ids), IN_BATCH):
+            q = (
+                select(Relationship.parent_item, func.count(func.distinct(Relationship.child_item)))
+                .where(edges & Relationship.parent_item.in_(parent_ids[i:i + IN_BATCH]))
+                .group_by(Relationship.parent_item)
+            )
+            out.update({p: n for p, n in (await self._db.execute(q)).all()})
+        return out
+
+    @coalesced
+    async def tree_layout(self, dataset_id: int, root_id: str, depth: int, params: LayoutParams, max_nodes: int) -> dict:
+        """
+        Tidy-tree coordinates for the subtree under root_id, `depth` levels deep.
 
+        Children are read breadth-first, level by level, in sequence order. A
+        part reused elsewhere in the subtree is placed once, at its first
+        breadth-first occurrence (the client keys nodes by id), and counted in
+        `reused_edges`. At most max_nodes nodes are placed (`truncated`).
+        Cached per (database, dataset sha, root, depth, params, max_nodes).
+        """
+        key = (self._db_key(), await self._dataset_sha(dataset_id), root_id, depth, params, max_nodes)
+        hit = layouts.get(key)
+        if hit is not None:
+            return hit
 
+        kids: Dict[str, List[str]] = {}
+        num_children: Dict[str, int] = {}
+        placed = {root_id}
+        read = set()
+        seen_edges = set()
+        frontier = [root_id]
+        reused = 0
+        truncated = False
+        for _ in range(depth):
+            if not frontier or truncated:
+                break
+            read.update(frontier)
+            nxt: List[str] = []
+            for parent, child, _seq in await self.children_of(dataset_id, frontier):
+                if (parent, child) in seen_edges:
+                    continue  # same edge recorded at another level
+                seen_edges.add((parent, child))
+                num_children[parent] = num_children.get(parent, 0) + 1
+                if child in placed:
+                    reused += 1
+                    continue
+                if len(placed) >= max_nodes:
+                    truncated = True
+                    continue
+                placed.add(child)
+                kids.setdefault(parent, []).append(child)
+                nxt.append(child)
+            frontier = nxt
+        # nodes whose children were not read still report how many they have
+        unread = [n for n in placed if n not in read]
+        num_children.update(await self.count_children(dataset_id, unread))
 
+        nodes = await run_in_threadpool(layout, root_id, kids, params)
+        for n in nodes:
+            n["num_children"] = num_children.get(n["id"], 0)
+        result = {
+            "root": root_id,
+            "depth": depth,
+            "params": params._asdict(),
+            "count": len(nodes),
+            "reused_edges": reused,
+            "truncated": truncated,
+            "nodes": nodes,
+        }
+        layouts.put(key, result)
+        return result
+
+    @coalesced
+    async def level_summary(self, dataset_id: int, engine_id: Optional[str] = None) -> List[dict]:
+        """
+        Per-BOM-level aggregates from grouped queries on (dataset_id, level):
+        edges, distinct nodes (children at that level), distinct parents,
+        average and max fan-out of those parents, and leaves (nodes at that
+        level without children anywhere in the dataset).
+        """
+        edges = await self._edges(dataset_id, engine_id)
+        R = Relationship
+        res = await self._db.execute(
+            select(R.level, func.count(), func.count(func.distinct(R.child_item)), func.count(func.distinct(R.parent_item)))
+            .where(edges).group_by(R.level).order_by(R.level)
+        )
+        out = {
+            lvl: {"level": lvl, "edges": e, "nodes": n, "parents": p, "avg_fanout": round(e / p, 3) if p else 0.0,
+                  "max_fanout": 0, "leaves": 0}
+            for lvl, e, n, p in res.all()
+        }
+        if not out:
+            return []
+
+        fan = select(R.level, R.parent_item, func.count().label("n")).where(edges).group_by(R.level, R.parent_item).subquery()
+        for lvl, m in (await self._db.execute(select(fan.c.level, func.max(fan.c.n)).group_by(fan.c.level))).all():
+            out[lvl]["max_fanout"] = m
+
+        below = aliased(Relationship)
+        has_children = exists().where(await self._edges(dataset_id, engine_id, below) & (below.parent_item == R.child_item))
+        res = await self._db.execute(
+            select(R.level, func.count(func.distinct(R.child_item))).where(edges & ~has_children).group_by(R.level)
+        )
+        for lvl, leaves in res.all():
+            out[lvl]["leaves"] = leaves
+        return list(out.values())
+
+    async def nodes_at_level(
+        self, dataset_id: int, level: int, after: Optional[str] = None, limit: int = 100, engine_id: Optional[str] = None,
+    ) -> Tuple[List[dict], int]:
+        """
+        Distinct nodes at a BOM level, ordered by id, keyset-paginated (`after`
+        = last id of the previous page), with how many parents each has there.
+        Returns (page, total nodes at that level).
+        """
+        edges = await self._edges(dataset_id, engine_id) & (Relationship.level == level)
+        q = select(Relationship.child_item, func.count(func.distinct(Relationship.parent_item))).where(edges)
+        if after is not None:
+            q = q.where(Relationship.child_item > after)
+        q = q.group_by(Relationship.child_item).order_by(Relationship.child_item).limit(limit)
+        page = [{"id": c, "name": c, "parents": p} for c, p in (await self._db.execute(q)).all()]
+        total = await self._db.execute(select(func.count(func.distinct(Relationship.child_item))).where(edges))
+        return page, total.scalar() or 0
+
+    # ---- ancestry index ----------------------------------------------
+    async def build_ancestry(
+        self, dataset_id: int, edges: Optional[Tuple[List[str], List[str]]] = None, strict: bool = False,
+    ) -> Optional[int]:
+        """
+        (Re)build the dataset's ancestry closure from `edges` (parents, children)
+        or from its stored edges. Returns the number of pairs, or None when the
+        index is skipped (cycles, or more than ANCESTRY_MAX_ROWS pairs); with
+        strict=True those raise instead. No commit.
+        """
+        parents, children = edges if edges is not None else await self.edge_pairs(dataset_id)
+        await self._db.execute(delete(Ancestry).where(Ancestry.dataset_id == dataset_id))
+        try:
+            c = await run_in_threadpool(closure, parents, children, ANCESTRY_MAX_ROWS)
+        except (ClosureTooLarge, CyclicGraph) as e:
+            if strict:
+                raise
+            log.warning("no ancestry index for dataset %s: %s", dataset_id, e)
+            return None
+        # rows are materialized one batch at a time, off the event loop
+        cols = ("dataset_id", "descendant", "ancestor", "depth_min", "depth_max")
+        batch = INSERT_BATCH * 10
+        for i in range(0, c.size, batch):
+            rows = await run_in_threadpool(c.rows, dataset_id, i, i + batch)
+            await self._insert_rows(Ancestry.__table__, cols, rows)
+        return c.size
+
+    async def has_ancestry(self, dataset_id: int) -> bool:
+        res = await self._db.execute(select(Ancestry.ancestor).where(Ancestry.dataset_id == dataset_id).limit(1))
+        return res.first() is not None
+
+    async def ancestors(self, dataset_id: int, node_id: str) -> List[dict]:
+        """Every ancestor of node_id, nearest first (empty for roots and unknown nodes)."""
+        q = (
+            select(Ancestry.ancestor, Ancestry.depth_min, Ancestry.depth_max)
+            .where((Ancestry.dataset_id == dataset_id) & (Ancestry.descendant == node_id) & (Ancestry.depth_min > 0))
+            .order_by(Ancestry.depth_min, Ancestry.ancestor)
+        )
+        return [{"id": a, "distance_min": lo, "distance_max": hi} for a, lo, hi in (await self._db.execute(q)).all()]
+
+    async def descendants(
+        self, dataset_id: int, node_id: str, max_depth: Optional[int] = None, after: Optional[str] = None, limit: int = 100,
+    ) -> Tuple[List[dict], int]:
+        """Descendants of node_id ordered by id (keyset-paginated), optionally within max_depth steps; plus the total."""
+        cond = (Ancestry.dataset_id == dataset_id) & (Ancestry.ancestor == node_id) & (Ancestry.depth_min > 0)
+        if max_depth is not None:
+            cond = cond & (Ancestry.depth_min <= max_depth)
+        q = select(Ancestry.descendant, Ancestry.depth_min, Ancestry.depth_max).where(cond)
+        if after is not None:
+            q = q.where(Ancestry.descendant > after)
+        q = q.order_by(Ancestry.descendant).limit(limit)
+        page = [{"id": d, "distance_min": lo, "distance_max": hi} for d, lo, hi in (await self._db.execute(q)).all()]
+        total = await self._db.execute(select(func.count()).select_from(Ancestry).where(cond))
+        return page, total.scalar() or 0
+
+    async def ancestry_pair(self, dataset_id: int, ancestor: str, descendant: str) -> Optional[Tuple[int, int]]:
+        """(shortest, longest) path length from ancestor down to descendant, or None if it is not one."""
+        res = await self._db.execute(
+            select(Ancestry.depth_min, Ancestry.depth_max).where(
+                (Ancestry.dataset_id == dataset_id) & (Ancestry.descendant == descendant) & (Ancestry.ancestor == ancestor)
+            )
+        )
+        row = res.first()
+        return (row[0], row[1]) if row else None
+
+    async def lowest_common_ancestors(self, dataset_id: int, a: str, b: str) -> List[dict]:
+        """
+        Common ancestors of a and b (either may be the other's ancestor) that
+        have no common ancestor below them; in a DAG there can be several.
+        """
+        x, y = aliased(Ancestry), aliased(Ancestry)
+        q = (
+            select(x.ancestor, x.depth_min, y.depth_min)
+            .join(y, and_(y.dataset_id == x.dataset_id, y.ancestor == x.ancestor, y.descendant == b))
+            .where((x.dataset_id == dataset_id) & (x.descendant == a))
+        )
+        common = {anc: (da, db) for anc, da, db in (await self._db.execute(q)).all()}
+        if not common:
+            return []
+        # drop every common ancestor that has another common ancestor below it
+        higher = set()
+        names = list(common)
+        for i in range(0, len(names), IN_BATCH):
+            q = select(Ancestry.ancestor).where(
+                (Ancestry.dataset_id == dataset_id)
+                & Ancestry.descendant.in_(names)
+                & Ancestry.ancestor.in_(names[i:i + IN_BATCH])
+                & (Ancestry.depth_min > 0)
+            ).distinct()
+            higher.update(r[0] for r in (await self._db.execute(q)).all())
+        lowest = [
+            {"id": n, "distance_a": da, "distance_b": db}
+            for n, (da, db) in common.items() if n not in higher
+        ]
+        return sorted(lowest, key=lambda r: (r["distance_a"] + r["distance_b"], r["id"]))
+
+    async def node_depth(self, dataset_id: int, node_id: str) -> Optional[dict]:
+        """Shortest and longest distance from any root down to node_id (None if the node is unknown)."""
+        roots_of = aliased(Ancestry)
+        is_root = ~exists().where(
+            (roots_of.dataset_id == dataset_id) & (roots_of.descendant == Ancestry.ancestor) & (roots_of.depth_min > 0)
+        )
+        res = await self._db.execute(
+            select(func.min(Ancestry.depth_min), func.max(Ancestry.depth_max), func.count())
+            .where((Ancestry.dataset_id == dataset_id) & (Ancestry.descendant == node_id) & is_root)
+        )
+        lo, hi, roots = res.first()
+        if not roots:
+            return None
+        return {"id": node_id, "depth_min": lo, "depth_max": hi, "roots": roots}
@@ -0,0 +1,61 @@
+# server/tools/check_import_time.py
+"""
+Cold-start guard: imports `main` in a fresh interpreter and fails if it takes
+longer than the budget or drags in the CSV parsing stack (pandas/NumPy).
+
+    python tools/check_import_time.py            # default budget
+    python tools/check_import_time.py --budget 2.5 --runs 5
+
+Run from server/. Exit code 1 means the budget was exceeded.
+"""
+from __future__ import annotations
+import argparse, json, os, subprocess, sys
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+
+# modules that must stay out of the startup path (loaded on first CSV import)
+LAZY_MODULES = ("pandas", "numpy")
+
+_PROBE = (
+    "import json, sys, time\n"
+    "t = time.perf_counter()\n"
+    "import main\n"
+    "dt = time.perf_counter() - t\n"
+    "print(json.dumps({'seconds': dt, 'loaded': [m for m in %r if m in sys.modules]}))\n"
+) % (LAZY_MODULES,)
+
+
+def measure_once() -> dict:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=SERVER_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_BUDGET_S", "2.0")),
+                    help="max seconds for `import main` (best of --runs)")
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    results = [measure_once() for _ in range(max(1, args.runs))]
+    best = min(r["seconds"] for r in results)
+    loaded = sorted({m for r in results for m in r["loaded"]})
+
+    print(f"import main: best {best:.3f}s over {len(results)} runs (budget {args.budget:.2f}s)")
+    ok = True
+    if loaded:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(loaded)}")
+        ok = False
+    if best > args.budget:
+        print("FAIL: import time over budget")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+# server/tools/load_replay.py
+"""
+Load replay: simulated users browse a dataset the way the frontend does
+(Graph.tsx / node-service.tsx), against a running server, at increasing
+concurrency. Reports throughput, latency percentiles per endpoint and error
+rate for each level.
+
+One session = GET /sources, GET /root_node, then `--expansions` clicks
+(GET /child_node on a random already-visible node that has children, with
+`--child-limit` like the "number of children" box), then `--searches`
+path lookups (GET /sources/children/path/{id}) on random known nodes.
+Each simulated user runs sessions back to back (closed loop), waiting
+`--think-ms` between requests.
+
+    # synthetic dataset in its own SQLite file (registered + imported via the API)
+    python tools/load_replay.py --url http://127.0.0.1:8000 --levels 1,8,32,64 --duration 20
+
+    # an existing dataset
+    python tools/load_replay.py --connection-id 1 --dataset-id 3 --api-key secret123
+
+Run from server/. Stdlib only; the client uses one keep-alive connection per
+simulated user. It is single-process Python, so past a few hundred requests
+per second it measures itself: check its CPU before reading the server's limit.
+"""
+from __future__ import annotations
+import argparse, csv, http.client, io, json, os, random, sys, threading, time, uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode, urlsplit
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+
+ENDPOINTS = ("sources", "root_node", "child_node", "path")
+
+# ---------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------
+class Client:
+    """One keep-alive HTTP/1.1 connection; reconnects after a failure."""
+    def __init__(self, base: str, api_key: Optional[str], timeout: float):
+        u = urlsplit(base)
+        self._cls = http.client.HTTPSConnection if u.scheme == "https" else http.client.HTTPConnection
+        self._host, self._port = u.hostname, u.port
+        self._prefix = u.path.rstrip("/") + "/api"
+        self._headers = {"x-api-key": api_key} if api_key else {}
+        self._timeout = timeout
+        self._conn = None
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[dict] = None) -> Tuple[int, bytes]:
+        if self._conn is None:
+            self._conn = self._cls(self._host, self._port, timeout=self._timeout)
+        try:
+            self._conn.request(method, self._prefix + path, body=body, headers={**self._headers, **(headers or {})})
+            resp = self._conn.getresponse()
+            return resp.status, resp.read()
+        except Exception:
+            self.close()
+            raise
+
+    def get_json(self, path: str, **params) -> Tuple[int, object]:
+        status, data = self.request("GET", path + ("?" + urlencode(params) if params else ""))
+        return status, (json.loads(data) if data else None)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+# ---------------------------------------------------------------------
+# synthetic dataset
+# ---------------------------------------------------------------------
+def synthetic_bom(depth: int, fanout: int, reuse: float, seed: int) -> Tuple[bytes, List[str]]:
+    """
+    Old-schema CSV of a layered BOM under one root "P0": every node above
+    `depth` has `fanout` children on the next level. With `reuse` > 0 a level
+    has that fraction fewer distinct parts than slots, so subassemblies are
+    shared (a DAG, like real where-used data). Returns (csv bytes, node ids).
+    """
+    rng = random.Random(seed)
+    out = io.StringIO()
+    w = csv.writer(out, lineterminator="\n")
+    w.writerow(["parent_item", "child_item", "sequence_no", "level"])
+    level_nodes = ["P0"]
+    nodes = ["P0"]
+    for level in range(1, depth + 1):
+        slots = len(level_nodes) * fanout
+        width = max(fanout, int(slots * (1.0 - reuse)))
+        names = [f"L{level}-{i:07d}" for i in range(width)]
+        used = set()
+        for parent in level_nodes:
+            for seq, k in enumerate(rng.sample(range(width), fanout), start=1):
+                w.writerow([parent, names[k], seq * 10, level])
+                used.add(k)
+        level_nodes = [names[k] for k in sorted(used)]
+        nodes += level_nodes
+    return out.getvalue().encode(), nodes
+
+def _multipart(fields: Dict[str, str], filename: str, content: bytes) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for k, v in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: text/csv\r\n\r\n".encode() + content + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+def prepare_synthetic(base: str, api_key: Optional[str], args) -> Tuple[int, int, List[str]]:
+    """Register a SQLite connection for the synthetic dataset (once) and import it. Returns (conn, dataset, nodes)."""
+    content, nodes = synthetic_bom(args.depth, args.fanout, args.reuse, args.seed)
+    db_path = Path(args.db).resolve()
+    url = f"sqlite+aiosqlite:///{db_path}"
+    c = Client(base, None, 600)
+
+    _, sources = c.get_json("/sources")
+    conn_id = next((x["id"] for x in sources["db_connections"] if x["url"] == url), None)
+    if conn_id is None:
+        body = json.dumps({"name": "load-replay", "url": url, "api_key": api_key}).encode()
+        status, data = c.request("POST", "/db/register", body, {"Content-Type": "application/json"})
+        if status != 200:
+            sys.exit(f"registering {url} failed: {status} {data[:300]!r}")
+        conn_id = json.loads(data)["connection_id"]
+
+    body, ctype = _multipart({"import_now": "true", "connection_id": str(conn_id)}, "load_replay.csv", content)
+    headers = {"Content-Type": ctype, **({"x-api-key": api_key} if api_key else {})}
+    t = time.perf_counter()
+    status, data = c.request("POST", "/upload_csv", body, headers)
+    if status != 200:
+        sys.exit(f"importing the synthetic dataset failed: {status} {data[:300]!r}")
+    res = json.loads(data)
+    print(f"synthetic dataset: {len(nodes)} nodes, {res['rows']} edges, connection {conn_id}, "
+          f"dataset {res['dataset_id']} ({res['message']}, {time.perf_counter() - t:.1f}s)")
+    c.close()
+    return conn_id, res["dataset_id"], nodes
+
+# ---------------------------------------------------------------------
+# sessions
+# ---------------------------------------------------------------------
+class Recorder:
+    """Latencies and outcomes per endpoint (thread-safe append)."""
+    def __init__(self):
+        self.lat: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.sessions = 0
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, seconds: float, error: Optional[str]) -> None:
+        with self._lock:
+            self.lat[endpoint].append(seconds)
+            if error:
+                self.errors[endpoint][error] += 1
+
+    def session_done(self) -> None:
+        with self._lock:
+            self.sessions += 1
+
+class User(threading.Thread):
+    def __init__(self, args, conn_id: int, dataset_id: int, known: List[str],
+                 rec: Recorder, deadline: float, seed: int):
+        super().__init__(daemon=True)
+        self.args, self.rec, self.deadline = args, rec, deadline
+        self.params = {"connection_id": conn_id, "dataset_id": dataset_id}
+        self.known = known
+        self.rng = random.Random(seed)
+        self.client = Client(args.url, args.api_key, args.timeout)
+
+    def call(self, endpoint: str, path: str, **params):
+        if self.args.think_ms:
+            time.sleep(self.rng.expovariate(1000.0 / self.args.think_ms))
+        t = time.perf_counter()
+        try:
+            status, body = self.client.get_json(path, **params)
+            error = None if status == 200 else str(status)
+        except Exception as e:
+            status, body, error = None, None, type(e).__name__
+        self.rec.add(endpoint, time.perf_counter() - t, error)
+        return body if error is None else None
+
+    def session(self) -> None:
+        a = self.args
+        if not a.no_sources:
+            self.call("sources", "/sources")
+        res = self.call("root_node", "/root_node", **self.params)
+        roots = (res or {}).get("root_nodes") or []
+        if not roots:
+            return
+        # visible nodes that can still be expanded
+        expandable = [r for r in roots if (res.get("children_count") or {}).get(r)]
+        for _ in range(a.expansions):
+            if not expandable or time.perf_counter() > self.deadline:
+                break
+            node = self.rng.choice(expandable)
+            extra = {"limit": a.child_limit} if a.child_limit else {}
+            res = self.call("child_node", "/child_node", node_id=node, **self.params, **extra)
+            for ch in (res or {}).get("children") or []:
+                if ch.get("num_children"):
+                    expandable.append(ch["id"])
+                if len(self.known) < 100_000:
+                    self.known.append(ch["id"])
+        for _ in range(a.searches):
+            if not self.known or time.perf_counter() > self.deadline:
+                break
+            node = self.rng.choice(self.known)
+            self.call("path", f"/sources/children/path/{quote(node, safe='')}", **self.params)
+        self.rec.session_done()
+
+    def run(self) -> None:
+        try:
+            while time.perf_counter() < self.deadline:
+                self.session()
+        finally:
+            self.client.close()
+
+# ---------------------------------------------------------------------
+# report
+# ---------------------------------------------------------------------
+def _pct(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+def summarize(users: int, rec: Recorder, elapsed: float) -> dict:
+    per = {}
+    total = errs = 0
+    for ep in ENDPOINTS:
+        vals = sorted(rec.lat.get(ep, []))
+        if not vals:
+            continue
+        n_err = sum(rec.errors[ep].values())
+        total += len(vals)
+        errs += n_err
+        per[ep] = {
+            "requests": len(vals),
+            "rps": round(len(vals) / elapsed, 1),
+            "p50_ms": round(_pct(vals, 0.50) * 1000, 1),
+            "p95_ms": round(_pct(vals, 0.95) * 1000, 1),
+            "p99_ms": round(_pct(vals, 0.99) * 1000, 1),
+            "max_ms": round(vals[-1] * 1000, 1),
+            "error_rate": round(n_err / len(vals), 4),
+            "errors": dict(rec.errors[ep]),
+        }
+    return {
+        "users": users,
+        "seconds": round(elapsed, 2),
+        "sessions": rec.sessions,
+        "requests": total,
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "error_rate": round(errs / total, 4) if total else 0.0,
+        "endpoints": per,
+    }
+
+def print_level(s: dict) -> None:
+    print(f"\n== {s['users']} users: {s['rps']} req/s, {s['sessions']} sessions, "
+          f"error rate {s['error_rate']:.2%} ({s['requests']} requests in {s['seconds']}s)")
+    print(f"  {'endpoint':<11}{'req':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  errors")
+    for ep, e in s["endpoints"].items():
+        errs = ", ".join(f"{k}x{v}" for k, v in sorted(e["errors"].items())) or "-"
+        print(f"  {ep:<11}{e['requests']:>8}{e['rps']:>9}{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}{e['max_ms']:>9}  {errs}")
+
+def run_level(args, users: int, conn_id: int, dataset_id: int, known: List[str]) -> dict:
+    rec = Recorder()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [User(args, conn_id, dataset_id, known, rec, deadline, args.seed * 1_000_003 + users * 1009 + i)
+               for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(users, rec, time.perf_counter() - start)
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default=os.getenv("LOAD_URL", "http://127.0.0.1:8000"), help="server base URL")
+    ap.add_argument("--api-key", default=os.getenv("LOAD_API_KEY", "load-replay"),
+                    help="x-api-key (also set on the synthetic connection)")
+    ap.add_argument("--connection-id", type=int, help="replay an existing dataset (with --dataset-id)")
+    ap.add_argument("--dataset-id", type=int)
+    ap.add_argument("--levels", default="1,4,16,64", help="comma-separated concurrent users per step")
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    ap.add_argument("--expansions", type=int, default=8, help="child_node clicks per session")
+    ap.add_argument("--searches", type=int, default=2, help="path lookups per session")
+    ap.add_argument("--child-limit", type=int, default=0, help="limit= on child_node (0 = all children)")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="mean pause before each request (exponential)")
+    ap.add_argument("--no-sources", action="store_true", help="skip the GET /sources at session start")
+    ap.add_argument("--timeout", type=float, default=30.0, help="per-request timeout (s)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="also write the results here")
+    g = ap.add_argument_group("synthetic dataset (when no --dataset-id)")
+    g.add_argument("--db", default=str(SERVER_DIR / "data" / "load_replay.db"), help="SQLite file for it")
+    g.add_argument("--depth", type=int, default=5)
+    g.add_argument("--fanout", type=int, default=8)
+    g.add_argument("--reuse", type=float, default=0.3, help="fraction of shared subassemblies per level")
+    args = ap.parse_args()
+
+    if (args.connection_id is None) != (args.dataset_id is None):
+        ap.error("--connection-id and --dataset-id go together")
+    if args.dataset_id is None:
+        conn_id, dataset_id, known = prepare_synthetic(args.url, args.api_key, args)
+    else:
+        conn_id, dataset_id, known = args.connection_id, args.dataset_id, []
+
+    results = []
+    for users in (int(x) for x in args.levels.split(",") if x.strip()):
+        s = run_level(args, users, conn_id, dataset_id, known)
+        print_level(s)
+        results.append(s)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"url": args.url, "dataset_id": dataset_id, "levels": results}, indent=2))
+    return 1 if any(s["requests"] == 0 for s in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+# server/utils/admission.py
+from __future__ import annotations
+import asyncio, heapq, itertools, math, os, time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from fastapi import HTTPException
+from utils.metrics import Histogram
+from utils.cancellation import at_request_end, set_statement_timeout
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+# Slots shared by every admitted request in this worker.
+TOTAL_SLOTS = _env_int("ADMISSION_SLOTS", 16)
+# Slots only navigation may use, so heavy work can never starve interactive lookups.
+RESERVED_SLOTS = _env_int("ADMISSION_RESERVED_SLOTS", 4)
+# Longest a request may wait for a slot before it is turned away with 429.
+MAX_WAIT_S = float(os.getenv("ADMISSION_MAX_WAIT_S", "30"))
+
+@dataclass
+class RequestClass:
+    """
+    One kind of work: at most `limit` run at once and at most `queue` wait.
+    Lower `priority` is served first when a slot frees up. Each SQL statement
+    of an admitted request may run for `statement_timeout_s` (0 = no limit).
+    """
+    name: str
+    priority: int
+    limit: int
+    queue: int
+    statement_timeout_s: float = 0.0
+    active: int = 0
+    waiting: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    hold_ewma_s: float = 0.0
+    wait: Histogram = field(default_factory=Histogram)
+
+    def to_dict(self) -> dict:
+        return {
+            "priority": self.priority,
+            "limit": self.limit,
+            "queue": self.queue,
+            "statement_timeout_s": self.statement_timeout_s or None,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_hold_s": round(self.hold_ewma_s, 3),
+            "wait": self.wait.to_dict(),
+        }
+
+# navigation: root/child lookups (cheap, interactive) - only bounded by the shared slots
+# traversal:  whole-dataset walks (path to node, subtree work)
+# import:     CSV parse + bulk insert (CPU + SQLite writer lock)
+# export:     dataset copies/dumps
+def _timeout(name: str, default: float) -> float:
+    return float(os.getenv(f"STATEMENT_TIMEOUT_{name.upper()}_S", str(default)))
+
+CLASSES = {
+    "navigation": RequestClass("navigation", 0, TOTAL_SLOTS, _env_int("ADMISSION_NAVIGATION_QUEUE", 256),
+                               _timeout("navigation", 10)),
+    "traversal": RequestClass("traversal", 1, _env_int("ADMISSION_TRAVERSAL_LIMIT", 4), _env_int("ADMISSION_TRAVERSAL_QUEUE", 32),
+                              _timeout("traversal", 30)),
+    "import": RequestClass("import", 2, _env_int("ADMISSION_IMPORT_LIMIT", 2), _env_int("ADMISSION_IMPORT_QUEUE", 8),
+                           _timeout("import", 120)),
+    "export": RequestClass("export", 2, _env_int("ADMISSION_EXPORT_LIMIT", 2), _env_int("ADMISSION_EXPORT_QUEUE", 8),
+                           _timeout("export", 120)),
+}
+
+class Scheduler:
+    """
+    Per-worker admission control. Every request of a class takes one of the
+    shared slots and counts against its class limit; waiters are granted in
+    (priority, arrival) order, so queued navigation always goes before queued
+    imports. Heavy classes may not use the last `reserved` slots, so navigation
+    always has room even when every heavy slot is busy. A full class queue
+    (or a wait longer than MAX_WAIT_S) answers 429 with Retry-After.
+    """
+    def __init__(self, total: int, reserved: int, classes: Dict[str, RequestClass]):
+        self.total = total
+        self.reserved = min(reserved, total - 1)
+        self.used = 0
+        self.classes = classes
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+
+    def _retry_after(self, rc: RequestClass) -> int:
+        # time for the work ahead of a new arrival to drain through the class limit
+        per = rc.hold_ewma_s or 1.0
+        return max(1, math.ceil(per * (rc.waiting + rc.active + 1) / max(rc.limit, 1)))
+
+    def _reject(self, rc: RequestClass, why: str) -> HTTPException:
+        rc.rejected += 1
+        return HTTPException(
+            status_code=429,
+            detail=f"too many concurrent {rc.name} requests ({why}); retry later",
+            headers={"Retry-After": str(self._retry_after(rc))},
+        )
+
+    def _can_run(self, rc: RequestClass) -> bool:
+        free = self.total - self.used - (0 if rc.priority == 0 else self.reserved)
+        return free > 0 and rc.active < rc.limit
+
+    def _grant(self, rc: RequestClass) -> None:
+        self.used += 1
+        rc.active += 1
+        rc.admitted += 1
+
+    def _dispatch(self) -> None:
+        """Wake waiters in priority order while slots are free (skipping classes at their limit)."""
+        skipped = []
+        while self._heap and self.used < self.total:
+            entry = heapq.heappop(self._heap)
+            _, _, rc, fut = entry
+            if fut.done():  # cancelled or timed out while queued
+                continue
+            if not self._can_run(rc):
+                skipped.append(entry)
+                continue
+            rc.waiting -= 1
+            self._grant(rc)
+            fut.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+
+    async def acquire(self, name: str) -> None:
+        rc = self.classes[name]
+        # _dispatch grants every waiter that can run, so anyone still queued is
+        # blocked by its own limits: a request that can run now jumps no one
+        if self._can_run(rc):
+            self._grant(rc)
+            rc.wait.observe(0.0)
+            return
+        if rc.waiting >= rc.queue:
+            raise self._reject(rc, "queue full")
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (rc.priority, next(self._seq), rc, fut))
+        rc.waiting += 1
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), MAX_WAIT_S)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                self.release(name, 0.0)  # granted at the same moment we gave up
+            else:
+                fut.cancel()
+                rc.waiting -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(rc, f"waited {MAX_WAIT_S:g}s")
+            raise
+        rc.wait.observe((time.perf_counter() - t0) * 1000)
+
+    def release(self, name: str, held_s: float) -> None:
+        rc = self.classes[name]
+        self.used -= 1
+        rc.active -= 1
+        if held_s:
+            rc.hold_ewma_s = held_s if not rc.hold_ewma_s else 0.8 * rc.hold_ewma_s + 0.2 * held_s
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, name: str):
+        await self.acquire(name)
+        set_statement_timeout(self.classes[name].statement_timeout_s)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(name, time.perf_counter() - t0)
+
+    async def hold(self, name: str) -> Callable[[], None]:
+        """
+        Acquire a `name` slot that outlives the handler (streaming responses):
+        returns an idempotent release, which also runs when the request ends.
+        """
+        await self.acquire(name)
+        set_statement_timeout(self.classes[name].statement_timeout_s)
+        t0 = time.perf_counter()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.release(name, time.perf_counter() - t0)
+
+        at_request_end(release)
+        return release
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.total,
+            "reserved_for_navigation": self.reserved,
+            "used": self.used,
+            "classes": {k: v.to_dict() for k, v in self.classes.items()},
+        }
+
+scheduler = Scheduler(TOTAL_SLOTS, RESERVED_SLOTS, CLASSES)
+
+def admit(name: str):
+    """FastAPI dependency holding a `name` slot for the duration of the request."""
+    async def _dep():
+        async with scheduler.slot(name):
+            yield
+    return _dep
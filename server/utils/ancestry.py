@@ -0,0 +1,138 @@
+# server/utils/ancestry.py
+from __future__ import annotations
+import itertools
+from typing import Iterable, List, NamedTuple, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+class Closure(NamedTuple):
+    """
+    Reflexive transitive closure as arrays: row i says node names[ancestor[i]]
+    reaches names[descendant[i]] in depth_min[i]..depth_max[i] steps. Kept
+    as integer codes so millions of rows cost a few bytes each; rows() turns
+    a slice into Python tuples for inserting.
+    """
+    names: "np.ndarray"
+    ancestor: "np.ndarray"
+    descendant: "np.ndarray"
+    depth_min: "np.ndarray"
+    depth_max: "np.ndarray"
+
+    @property
+    def size(self) -> int:
+        return len(self.ancestor)
+
+    def rows(self, dataset_id: int, start: int, stop: int) -> List[Tuple[int, str, str, int, int]]:
+        """(dataset_id, descendant, ancestor, depth_min, depth_max) for rows start:stop."""
+        return list(zip(
+            itertools.repeat(dataset_id),
+            self.names[self.descendant[start:stop]].tolist(),
+            self.names[self.ancestor[start:stop]].tolist(),
+            self.depth_min[start:stop].tolist(),
+            self.depth_max[start:stop].tolist(),
+        ))
+
+class ClosureTooLarge(ValueError):
+    """The closure would exceed the row cap (very deep chains or heavy reuse)."""
+
+class CyclicGraph(ValueError):
+    """The edges contain a cycle, so there is no ancestor order."""
+
+def _ranges(starts, lens):
+    """Concatenated index ranges [start, start+len) without a Python loop."""
+    import numpy as np
+
+    total = int(lens.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(total)
+
+def closure(parents: Iterable[str], children: Iterable[str], max_rows: int) -> Closure:
+    """
+    Ancestor/descendant pairs of a DAG, including every node with itself at
+    distance 0, with the shortest and longest path length between them.
+
+    Nodes are finished in topological waves (Kahn). For every node of a wave
+    the ancestor rows of all its parents are gathered in one vectorized step,
+    shifted by one, merged per (node, ancestor) with min/max and appended to
+    flat buffers. Cost is linear in the size of the result, which for a BOM is
+    about nodes x depth; ClosureTooLarge is raised once it would pass
+    `max_rows`, CyclicGraph when some nodes never become ready.
+    """
+    import numpy as np
+    import pandas as pd
+
+    edges = pd.DataFrame({"p": list(parents), "c": list(children)}, dtype=object).drop_duplicates()
+    m = len(edges)
+    codes, names = pd.factorize(pd.concat([edges["p"], edges["c"]], ignore_index=True).astype(str))
+    src, dst = codes[:m].astype(np.int64), codes[m:].astype(np.int64)
+    n = len(names)
+    if src.size and (src == dst).any():
+        raise CyclicGraph("self-loop")
+
+    # CSR over in-edges (parents of a node) and out-edges (children of a node)
+    in_src = src[np.argsort(dst, kind="stable")]
+    in_ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(dst, minlength=n), out=in_ptr[1:])
+    out_dst = dst[np.argsort(src, kind="stable")]
+    out_ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=out_ptr[1:])
+
+    # closure rows, grouped by descendant; node v owns rows start[v] : start[v] + size[v]
+    cap = max(1024, 4 * n)
+    anc = np.empty(cap, dtype=np.int64)
+    lo = np.empty(cap, dtype=np.int64)
+    hi = np.empty(cap, dtype=np.int64)
+    start = np.zeros(n, dtype=np.int64)
+    size = np.zeros(n, dtype=np.int64)
+    used = 0
+
+    remaining = np.bincount(dst, minlength=n)
+    ready = np.flatnonzero(remaining == 0)
+    done = 0
+    while len(ready):
+        # every (node, parent) pair of the wave, then every ancestor row of those parents
+        n_par = in_ptr[ready + 1] - in_ptr[ready]
+        par = in_src[_ranges(in_ptr[ready], n_par)]
+        node = np.repeat(ready, n_par)
+        rows = _ranges(start[par], size[par])
+        w_node = np.concatenate([np.repeat(node, size[par]), ready])
+        w_anc = np.concatenate([anc[rows], ready])
+        w_lo = np.concatenate([lo[rows] + 1, np.zeros(len(ready), dtype=np.int64)])
+        w_hi = np.concatenate([hi[rows] + 1, np.zeros(len(ready), dtype=np.int64)])
+
+        # merge an ancestor reached through several parents: min/max per (node, ancestor)
+        key = w_node * n + w_anc
+        order = np.argsort(key, kind="stable")
+        key, w_lo, w_hi = key[order], w_lo[order], w_hi[order]
+        first = np.flatnonzero(np.concatenate([[True], key[1:] != key[:-1]]))
+        w_lo = np.minimum.reduceat(w_lo, first)
+        w_hi = np.maximum.reduceat(w_hi, first)
+        key = key[first]
+        w_node, w_anc = key // n, key % n
+
+        k = len(key)
+        if used + k > max_rows:
+            raise ClosureTooLarge(f"closure passes {max_rows} rows")
+        if used + k > cap:
+            cap = max(2 * cap, used + k)
+            anc, lo, hi = (np.resize(x, cap) for x in (anc, lo, hi))
+        anc[used:used + k], lo[used:used + k], hi[used:used + k] = w_anc, w_lo, w_hi
+        counts = np.bincount(w_node, minlength=n)[ready]
+        start[ready] = used + np.cumsum(counts) - counts  # rows are sorted by node
+        size[ready] = counts
+        used += k
+        done += len(ready)
+
+        # release the children whose last parent just finished
+        kids = out_dst[_ranges(out_ptr[ready], out_ptr[ready + 1] - out_ptr[ready])]
+        targets, hits = np.unique(kids, return_counts=True)
+        remaining[targets] -= hits
+        ready = targets[remaining[targets] == 0]
+    if done < n:
+        raise CyclicGraph(f"{n - done} nodes are on or below a cycle")
+
+    desc = np.empty(used, dtype=np.int64)
+    desc[_ranges(start, size)] = np.repeat(np.arange(n), size)
+    return Closure(np.asarray(names, dtype=object), anc[:used], desc, lo[:used], hi[:used])
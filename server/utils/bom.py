@@ -0,0 +1,98 @@
+# server/utils/bom.py
+from __future__ import annotations
+from typing import Dict, Iterable, List, Tuple
+
+EXACT_LIMIT = 2 ** 53  # float64 counts above this are no longer exact
+
+class CyclicSubtree(ValueError):
+    """The part of the graph below the root is not a DAG, so occurrence counts are infinite."""
+
+def _gather(indptr, order, nodes):
+    """Positions (into the CSR-sorted edge arrays) of every out-edge of `nodes`."""
+    import numpy as np
+
+    starts = indptr[nodes]
+    lens = indptr[nodes + 1] - starts
+    total = int(lens.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    # ranges [start, start+len) flattened without a Python loop
+    offsets = np.repeat(starts - np.cumsum(lens) + lens, lens)
+    return order[offsets + np.arange(total)]
+
+def explode(parents: Iterable[str], children: Iterable[str], root: str) -> Tuple[List[Dict], bool]:
+    """
+    Occurrence roll-up of every descendant of `root`.
+
+    Each distinct parent->child edge means "one of child per parent", so a
+    part's occurrence count under the root is the number of distinct root->part
+    paths. It is computed without enumerating paths: one vectorized BFS marks
+    what is reachable (and the shallowest depth), then a wave-by-wave Kahn pass
+    pushes counts down the DAG, count[child] += count[parent] for each edge, in
+    topological order; the wave number is the deepest depth. O(V + E).
+
+    Returns ([{"id", "occurrences", "min_depth", "max_depth", "parents"}], exact)
+    for all descendants (root excluded), unsorted; `exact` is False when some
+    count passed 2**53 and is reported as a float. Unknown root or leaf: ([], True).
+    Raises CyclicSubtree when a cycle is reachable from the root.
+    """
+    import numpy as np
+    import pandas as pd
+
+    edges = pd.DataFrame({"p": list(parents), "c": list(children)}, dtype=object).drop_duplicates()
+    m = len(edges)
+    codes, names = pd.factorize(pd.concat([edges["p"], edges["c"]], ignore_index=True).astype(str))
+    src, dst = codes[:m].astype(np.int64), codes[m:].astype(np.int64)
+    n = len(names)
+    hit = np.flatnonzero(names == root)
+    if m == 0 or len(hit) == 0:
+        return [], True
+    r = int(hit[0])
+
+    # CSR over out-edges
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+
+    # 1) reachability + shallowest depth
+    min_depth = np.full(n, -1, dtype=np.int64)
+    min_depth[r] = 0
+    frontier, depth = np.array([r]), 0
+    while len(frontier):
+        depth += 1
+        nxt = np.unique(dst[_gather(indptr, order, frontier)])
+        nxt = nxt[min_depth[nxt] < 0]
+        min_depth[nxt] = depth
+        frontier = nxt
+    reach = min_depth >= 0
+
+    # 2) Kahn waves over the reachable sub-DAG
+    live = reach[src]
+    indeg = np.bincount(dst[live], minlength=n)
+    if indeg[r]:
+        raise CyclicSubtree(f"{root} is on a cycle")
+    count = np.zeros(n, dtype=np.float64)
+    count[r] = 1.0
+    max_depth = np.zeros(n, dtype=np.int64)
+    remaining = indeg.copy()
+    frontier, wave, done = np.array([r]), 0, 1
+    while len(frontier):
+        wave += 1
+        e = _gather(indptr, order, frontier)
+        np.add.at(count, dst[e], count[src[e]])
+        targets, hits = np.unique(dst[e], return_counts=True)
+        remaining[targets] -= hits
+        frontier = targets[remaining[targets] == 0]
+        max_depth[frontier] = wave
+        done += len(frontier)
+    if done < int(reach.sum()):
+        raise CyclicSubtree(f"a cycle is reachable from {root}")
+
+    ids = np.flatnonzero(reach)
+    ids = ids[ids != r]
+    exact = bool((count[ids] < EXACT_LIMIT).all())
+    occ = count[ids].astype(np.int64) if exact else count[ids]
+    return [
+        {"id": names[i], "occurrences": o, "min_depth": int(a), "max_depth": int(b), "parents": int(p)}
+        for i, o, a, b, p in zip(ids.tolist(), occ.tolist(), min_depth[ids].tolist(), max_depth[ids].tolist(), indeg[ids].tolist())
+    ], exact
@@ -0,0 +1,178 @@
+# server/utils/cancellation.py
+from __future__ import annotations
+import asyncio, logging
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Set
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+log = logging.getLogger("dvp.cancel")
+
+@dataclass
+class InFlight:
+    """Per-request handle: running DB statements, statement timeout, why it was stopped."""
+    statement_timeout_s: Optional[float] = None
+    sqlite_conns: Set = field(default_factory=set)  # sqlite3.Connection objects mid-statement
+    reason: Optional[str] = None                     # "disconnect" | "timeout"
+    cleanups: List[Callable[[], None]] = field(default_factory=list)
+
+    def interrupt(self, reason: str) -> None:
+        self.reason = self.reason or reason
+        for raw in list(self.sqlite_conns):
+            raw.interrupt()  # thread-safe; the statement fails with "interrupted"
+
+_inflight: ContextVar[Optional[InFlight]] = ContextVar("dvp_inflight", default=None)
+
+def set_statement_timeout(seconds: Optional[float]) -> None:
+    """Statement timeout for the rest of the current request (None/0 = no limit)."""
+    req = _inflight.get()
+    if req is not None:
+        req.statement_timeout_s = seconds or None
+
+def at_request_end(fn: Callable[[], None]) -> bool:
+    """
+    Run fn once the current request is over (response sent, failed or
+    cancelled), e.g. to release something a streaming body holds. False when
+    no request is being tracked; the caller must clean up itself.
+    """
+    req = _inflight.get()
+    if req is None:
+        return False
+    req.cleanups.append(fn)
+    return True
+
+def client_gone() -> bool:
+    """True once the current request's client has disconnected."""
+    req = _inflight.get()
+    return req is not None and req.reason == "disconnect"
+
+def _sqlite_handle(conn) -> Optional[object]:
+    # SQLAlchemy adapter -> aiosqlite.Connection -> sqlite3.Connection
+    driver = getattr(conn.connection, "driver_connection", None)
+    return getattr(driver, "_conn", driver) if driver is not None else None
+
+def track_engine(engine: AsyncEngine) -> AsyncEngine:
+    """
+    Let requests interrupt their own statements on this engine: on client
+    disconnect, and when a statement outlives the request's statement timeout.
+    SQLite statements are interrupted through sqlite3's interrupt(); Postgres
+    gets a server-side `statement_timeout`; cancelling the request task stops
+    asyncpg queries on its own.
+    """
+    sync = engine.sync_engine
+    dialect = sync.dialect.name
+
+    @event.listens_for(sync, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        req = _inflight.get()
+        if req is None:
+            return
+        timeout = req.statement_timeout_s
+        if dialect == "sqlite":
+            raw = _sqlite_handle(conn)
+            if raw is None:
+                return
+            req.sqlite_conns.add(raw)
+            if timeout:
+                timer = asyncio.get_running_loop().call_later(timeout, req.interrupt, "timeout")
+                conn.info.setdefault("dvp_timers", []).append(timer)
+        elif dialect == "postgresql":
+            ms = int(timeout * 1000) if timeout else 0
+            if conn.info.get("dvp_pg_timeout_ms") != ms:
+                cursor.execute(f"SET statement_timeout = {ms}")
+                conn.info["dvp_pg_timeout_ms"] = ms
+
+    def _done(conn):
+        timers = conn.info.get("dvp_timers")
+        if timers:
+            timers.pop().cancel()
+        req = _inflight.get()
+        if req is not None and dialect == "sqlite":
+            raw = _sqlite_handle(conn)
+            req.sqlite_conns.discard(raw)
+
+    @event.listens_for(sync, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _done(conn)
+
+    @event.listens_for(sync, "handle_error")
+    def _error(ctx):
+        if ctx.connection is not None:
+            _done(ctx.connection)
+        req = _inflight.get()
+        if req is not None and req.reason == "timeout":
+            raise HTTPException(status_code=504, detail="database statement timed out") from ctx.original_exception
+        if "statement timeout" in str(ctx.original_exception):  # Postgres' own timeout
+            raise HTTPException(status_code=504, detail="database statement timed out") from ctx.original_exception
+
+    if dialect == "postgresql":
+        @event.listens_for(sync, "rollback")
+        def _rollback(conn):
+            # a SET inside a rolled-back transaction is undone too
+            if not conn.invalidated:
+                conn.info.pop("dvp_pg_timeout_ms", None)
+
+    return engine
+
+class CancelOnDisconnectMiddleware:
+    """
+    Runs each HTTP request in its own task and watches the connection. If the
+    client goes away before the response is finished, the request's running
+    SQLite statements are interrupted and the task is cancelled, so abandoned
+    path walks, child listings and imports stop instead of running to the end
+    (an import's open transaction is rolled back). The request body is relayed
+    through a small buffer, so uploads keep their backpressure.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        req = InFlight()
+        token = _inflight.set(req)
+        inbox: asyncio.Queue = asyncio.Queue(maxsize=2)
+        sent_all = False
+
+        async def send_wrapper(message):
+            nonlocal sent_all
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                sent_all = True
+
+        try:
+            handler = asyncio.create_task(self.app(scope, inbox.get, send_wrapper))
+        finally:
+            _inflight.reset(token)
+
+        async def watch():
+            while True:
+                message = await receive()
+                await inbox.put(message)
+                if message["type"] == "http.disconnect":
+                    # the server also reports a disconnect once the response is complete
+                    if not handler.done() and not sent_all:
+                        scope["dvp.client_disconnected"] = True
+                        req.interrupt("disconnect")
+                        handler.cancel()
+                    return
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not scope.get("dvp.client_disconnected"):
+                raise  # the server is cancelling us, not the client
+            log.info("client went away, cancelled %s %s", scope["method"], scope["path"])
+        finally:
+            watcher.cancel()
+            if not handler.done():
+                handler.cancel()
+            for fn in req.cleanups:
+                try:
+                    fn()
+                except Exception:
+                    log.exception("request cleanup failed")
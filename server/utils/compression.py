@@ -0,0 +1,132 @@
+# server/utils/compression.py
+"""
+Transparent gzip/zstd handling for CSV files in data/.
+
+Uploads may arrive compressed (detected by magic bytes, not by name) and
+files are stored compressed with CSV_STORE_COMPRESSION. Readers go through
+open_logical(), which yields the decompressed bytes as a stream, so hashes and
+parsing always see the logical CSV no matter how it is stored.
+
+zstd needs the optional `zstandard` package; gzip is stdlib.
+"""
+from __future__ import annotations
+import gzip, logging, os, zlib
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+log = logging.getLogger("dvp.import")
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+GZIP_LEVEL = int(os.getenv("CSV_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("CSV_ZSTD_LEVEL", "3"))
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+def _store_codec() -> Optional[str]:
+    codec = os.getenv("CSV_STORE_COMPRESSION", "gzip").lower()
+    if codec in ("", "none", "off"):
+        return None
+    if codec == "zstd" and _zstd() is None:
+        log.warning("CSV_STORE_COMPRESSION=zstd but 'zstandard' is not installed; storing gzip")
+        return "gzip"
+    if codec not in SUFFIXES:
+        raise ValueError(f"unsupported CSV_STORE_COMPRESSION: {codec}")
+    return codec
+
+STORE_CODEC = _store_codec()
+
+def detect_codec(head: bytes) -> Optional[str]:
+    """'gzip' | 'zstd' from the first bytes of a file, None for plain data."""
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+def logical_name(name: str) -> str:
+    """Strip a compression suffix: 'bom.csv.gz' -> 'bom.csv'."""
+    for suffix in SUFFIXES.values():
+        if name.lower().endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+def stored_name(name: str, codec: Optional[str] = STORE_CODEC) -> str:
+    """File name for a logical CSV name under the given store codec."""
+    return logical_name(name) + (SUFFIXES[codec] if codec else "")
+
+class CodecUnavailable(RuntimeError):
+    """The data is compressed with a codec whose optional package is not installed."""
+
+def _require_zstd():
+    z = _zstd()
+    if z is None:
+        raise CodecUnavailable("zstd-compressed data needs the 'zstandard' package")
+    return z
+
+class Decompressor:
+    """
+    Incremental decompressor for one codec (None = pass-through). Raises
+    CodecUnavailable when the codec's package is missing.
+    """
+    def __init__(self, codec: Optional[str]):
+        self.codec = codec
+        if codec is not None:
+            self._d = self._new()
+
+    def _new(self):
+        if self.codec == "gzip":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return _require_zstd().ZstdDecompressor().decompressobj()
+
+    def feed(self, chunk: bytes) -> bytes:
+        if self.codec is None:
+            return chunk
+        if self._d.eof:  # the previous member/frame ended exactly at a chunk boundary
+            self._d = self._new()
+        out = [self._d.decompress(chunk)]
+        while self._d.eof and self._d.unused_data:  # concatenated gzip members / zstd frames
+            rest = self._d.unused_data
+            self._d = self._new()
+            out.append(self._d.decompress(rest))
+        return b"".join(out)
+
+    def finish(self) -> None:
+        if self.codec is not None and not self._d.eof:
+            raise ValueError(f"truncated {self.codec} stream")
+
+def open_writer(out: BinaryIO, codec: Optional[str] = STORE_CODEC) -> BinaryIO:
+    """Wrap a binary file so writes are compressed with `codec` (close the wrapper, then the file)."""
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=out, mode="wb", compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == "zstd":
+        return _require_zstd().ZstdCompressor(level=ZSTD_LEVEL).stream_writer(out, closefd=False)
+    return _Uncloseable(out)
+
+class _Uncloseable:
+    """Pass-through writer whose close() leaves the underlying file open."""
+    def __init__(self, f: BinaryIO):
+        self._f = f
+    def write(self, b: bytes) -> int:
+        return self._f.write(b)
+    def close(self) -> None:
+        pass
+
+def open_logical(path: Path) -> BinaryIO:
+    """Open a stored CSV for reading its decompressed bytes (streaming)."""
+    with open(path, "rb") as f:
+        codec = detect_codec(f.read(4))
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "zstd":
+        return _require_zstd().ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+    return open(path, "rb")
@@ -1,12 +1,22 @@
 # server/utils/csv_import.py
 from __future__ import annotations
 from pathlib import Path
-from typing import List, Dict, Tuple, Iterable, Optional
-import pandas as pd, io, hashlib, re, numpy as np
+from typing import BinaryIO, List, Dict, Tuple, Iterable, Optional, NamedTuple, TYPE_CHECKING
+import io, hashlib, logging, os, re, tempfile
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from utils.graph_checks import find_cycles
+from utils.compression import (
+    STORE_CODEC, CodecUnavailable, Decompressor, detect_codec, logical_name, open_logical, open_writer, stored_name,
+)
+
+# pandas is imported lazily inside the parsing functions: it dominates cold-start
+# time and most workers/reload cycles never import a CSV.
+if TYPE_CHECKING:
+    import pandas as pd
+    from fastapi import UploadFile
 
 DATA_DIR = Path(__file__).resolve().parents[1] / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 def sha256_bytes(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
@@ -14,6 +24,25 @@ def sha256_bytes(b: bytes) -> str:
 def sha256_text(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
+OLD_SCHEMA_COLS = {"parent_item", "child_item", "sequence_no", "level"}
+NEW_SCHEMA_COLS = {"engine_id", "system_id", "parent_item_id", "child_item_id", "bom_level", "sequenceno", "path"}
+
+HASH_CHUNK = 1 << 20  # 1 MiB
+CYCLE_POLICY = os.getenv("CYCLE_POLICY", "reject")  # "reject" | "warn"
+
+log = logging.getLogger("dvp.import")
+
+def sha256_file(path: Path) -> str:
+    """
+    Stream a file's logical (decompressed) bytes through SHA-256 without loading
+    it into memory, so a CSV hashes the same stored plain, gzip or zstd.
+    """
+    h = hashlib.sha256()
+    with open_logical(path) as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
 def _normalize_cols(cols):
     return [str(c).strip().lower().replace("\ufeff", "") for c in cols]
 
@@ -22,7 +51,60 @@ def _sniff_delimiter(sample: str) -> str:
     semis  = sample.count(";")
     return "," if commas >= semis else ";"
 
+def sniff_header(head: bytes) -> Tuple[str, List[str]]:
+    """(delimiter, normalized column names) from the header line in the first bytes of a file."""
+    first = head.decode("utf-8", errors="replace").splitlines()[0] if head else ""
+    sep = _sniff_delimiter(first)
+    return sep, _normalize_cols(first.split(sep))
+
+def schema_for(cols: Iterable[str]) -> Optional[str]:
+    """"old" | "new" for a set of normalized column names, None if neither."""
+    cols = set(cols)
+    if OLD_SCHEMA_COLS.issubset(cols):
+        return "old"
+    if NEW_SCHEMA_COLS.issubset(cols):
+        return "new"
+    return None
+
+def sniff_schema(head: bytes) -> Optional[str]:
+    """
+    Detect the schema ("old" | "new") from the header line in the first bytes
+    of a file, without parsing the body. Returns None if it isn't recognized.
+    """
+    return schema_for(sniff_header(head)[1])
+
+def headers_not_recognized(found: List[str]) -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"CSV headers not recognized. Expected either "
+               f"[parent_item, child_item, sequence_no, level] or "
+               f"[engine_id, system_id, parent_item_id, child_item_id, bom_level, sequenceno, path]. "
+               f"Found: {found}"
+    )
+
+def normalize_eng_ids(ids: Optional[Iterable[str]]) -> Optional[List[str]]:
+    """Sorted, de-duplicated, stripped eng_ids (None when nothing is left)."""
+    if not ids:
+        return None
+    out = sorted({str(x).strip() for x in ids if str(x).strip()})
+    return out or None
+
+def dataset_sha_for(file_sha: str, schema: Optional[str], eng_ids: Optional[List[str]]) -> str:
+    """
+    Dataset identity: the file hash, plus the eng_id scope when a new-schema file
+    is filtered. Matches what parse_csv_text reports in meta, so it can be
+    computed before parsing.
+    """
+    if schema == "new" and eng_ids:
+        return sha256_text(file_sha + "|" + "eng_ids:" + ",".join(eng_ids))
+    return file_sha
+
+def scope_meta(schema: Optional[str], eng_ids: Optional[List[str]]) -> dict:
+    filtered = schema == "new" and bool(eng_ids)
+    return {"schema": schema, "filtered": filtered, "eng_ids": eng_ids if filtered else None}
+
 def _parse_old_schema(df: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
     out = pd.DataFrame({
         "parent_item": df["parent_item"].astype(str).str.strip(),
         "child_item":  df["child_item"].astype(str).str.strip(),
@@ -34,10 +116,13 @@ def _parse_old_schema(df: pd.DataFrame) -> pd.DataFrame:
     return out
 
 def _parse_new_schema(df: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
     relationships = {}  # (parent, child) -> (sequence, level)
+    engines = {}        # (parent, child) -> engine_ids whose rows produced the edge
     
     for idx, row in df.iterrows():
         engine_id = str(row.get("engine_id", "")).strip()
+        keys = []  # edges this row contributes to
         system_id = str(row.get("system_id", "")).strip()
         path_str = str(row.get("path", "")).strip()
         parent_item_id = str(row.get("parent_item_id", "")).strip()
@@ -56,12 +141,14 @@ def _parse_new_schema(df: pd.DataFrame) -> pd.DataFrame:
         # 1. Add ENGINE_ID -> SYSTEM_ID relationship (level 1)
         if engine_id and system_id:
             rel_key = (engine_id, system_id)
+            keys.append(rel_key)
             if rel_key not in relationships:
                 relationships[rel_key] = (0, 0)  # Level 1, sequence 0 (implicit)
         
         # 2. Add explicit parent-child relationship from row
         if parent_item_id and child_item_id:
             rel_key = (parent_item_id, child_item_id)
+            keys.append(rel_key)
             # Keep the one with highest sequence number (most specific)
             if rel_key not in relationships or sequenceno > relationships[rel_key][0]:
                 relationships[rel_key] = (sequenceno, bom_level+1)
@@ -78,6 +165,7 @@ def _parse_new_schema(df: pd.DataFrame) -> pd.DataFrame:
                     parent = parts[i]
                     child = parts[i + 1]
                     rel_key = (parent, child)
+                    keys.append(rel_key)
                     
                     # Calculate level: first part (SYSTEM_ID) is level 1
                     level = i+2
@@ -85,6 +173,10 @@ def _parse_new_schema(df: pd.DataFrame) -> pd.DataFrame:
                     # For intermediate nodes, use sequence 0 unless we already have data
                     if rel_key not in relationships:
                         relationships[rel_key] = (0, level)
+
+        if engine_id:
+            for rel_key in keys:
+                engines.setdefault(rel_key, set()).add(engine_id)
     
     # Convert to DataFrame
     rows = []
@@ -94,10 +186,11 @@ def _parse_new_schema(df: pd.DataFrame) -> pd.DataFrame:
             "child_item": child,
             "sequence_no": sequence,
             "level": level,
+            "engine_ids": sorted(engines.get((parent, child), ())),
         })
     
     if not rows:
-        return pd.DataFrame(columns=["parent_item", "child_item", "sequence_no", "level"])
+        return pd.DataFrame(columns=["parent_item", "child_item", "sequence_no", "level", "engine_ids"])
     
     out = pd.DataFrame(rows)
     # Sort but keep all instances (don't drop duplicates at different levels)
@@ -106,6 +199,36 @@ def _parse_new_schema(df: pd.DataFrame) -> pd.DataFrame:
     out = out.drop_duplicates(subset=["parent_item", "child_item", "level"], keep="last").reset_index(drop=True)
     return out
 
+def _read_csv_frame(text: str) -> pd.DataFrame:
+    import pandas as pd
+
+    sample = text[:2048]
+    sep = _sniff_delimiter(sample)
+    try:
+        df = pd.read_csv(io.StringIO(text), sep=sep, engine="c", dtype=str, keep_default_na=False)
+    except Exception:
+        df = pd.read_csv(io.StringIO(text), sep=None, engine="python", dtype=str, keep_default_na=False)
+
+    df.columns = _normalize_cols(df.columns)
+    return df
+
+def _read_csv_path(path: Path) -> pd.DataFrame:
+    """_read_csv_frame for a stored file, reading (and decompressing) it as a stream."""
+    import pandas as pd
+
+    with open_logical(path) as f:
+        sep = _sniff_delimiter(f.read(2048).decode("utf-8", errors="replace"))
+    opts = dict(dtype=str, keep_default_na=False, encoding="utf-8", encoding_errors="replace")
+    try:
+        with open_logical(path) as f:
+            df = pd.read_csv(f, sep=sep, engine="c", **opts)
+    except Exception:
+        with open_logical(path) as f:
+            df = pd.read_csv(f, sep=None, engine="python", **opts)
+
+    df.columns = _normalize_cols(df.columns)
+    return df
+
 def parse_csv_text(
     text: str,
     filter_eng_ids: Optional[Iterable[str]] = None
@@ -114,14 +237,9 @@ def parse_csv_text(
     Parse CSV text in either schema, optionally filtering the *new* schema by eng_id.
     Returns (rows, meta) where rows are canonical dicts and meta has details about filtering.
     """
-    sample = text[:2048]
-    sep = _sniff_delimiter(sample)
-    try:
-        df = pd.read_csv(io.StringIO(text), sep=sep, engine="c", dtype=str, keep_default_na=False)
-    except Exception:
-        df = pd.read_csv(io.StringIO(text), sep=None, engine="python", dtype=str, keep_default_na=False)
+    return _parse_frame(_read_csv_frame(text), filter_eng_ids)
 
-    df.columns = _normalize_cols(df.columns)
+def _parse_frame(df: pd.DataFrame, filter_eng_ids: Optional[Iterable[str]] = None) -> tuple[List[Dict], dict]:
     cols = set(df.columns)
 
     meta = {
@@ -132,11 +250,11 @@ def parse_csv_text(
         "rows_out": None,
     }
 
-    if {"parent_item","child_item","sequence_no","level"}.issubset(cols):
+    if OLD_SCHEMA_COLS.issubset(cols):
         meta["schema"] = "old"
         out = _parse_old_schema(df)
 
-    elif {"engine_id","system_id","parent_item_id","child_item_id","bom_level","sequenceno","path"}.issubset(cols):
+    elif NEW_SCHEMA_COLS.issubset(cols):
         meta["schema"] = "new"
         if filter_eng_ids:
             eng_ids = sorted({str(x).strip() for x in filter_eng_ids if str(x).strip()})
@@ -148,24 +266,180 @@ def parse_csv_text(
         out = _parse_new_schema(df)
 
     else:
-        raise HTTPException(
-            status_code=400,
-            detail=f"CSV headers not recognized. Expected either "
-                   f"[parent_item, child_item, sequence_no, level] or "
-                   f"[engine_id, system_id, parent_item_id, child_item_id, bom_level, sequenceno, path]. "
-                   f"Found: {list(df.columns)}"
-        )
+        raise headers_not_recognized(list(df.columns))
 
     meta["rows_out"] = int(out.shape[0])
+    meta["cycles"] = find_cycles(out["parent_item"], out["child_item"])
     return out.to_dict(orient="records"), meta
 
+def ensure_acyclic(meta: dict) -> None:
+    """
+    Refuse to import a parsed CSV whose edges contain cycles or self-loops (422
+    with the offending edges). CYCLE_POLICY=warn imports it anyway; traversals
+    are guarded either way.
+    """
+    report = meta.get("cycles")
+    if not report or not report["has_cycles"]:
+        return
+    if CYCLE_POLICY == "warn":
+        log.warning("importing CSV with %d cyclic edges (CYCLE_POLICY=warn)", report["cyclic_edges"])
+    else:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": "CSV contains cycles; the hierarchy must be acyclic", "cycles": report},
+        )
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", Path(name).name) or "uploaded.csv"
+
 def save_bytes_unique(name: str, raw: bytes) -> Path:
-    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", Path(name).name) or "uploaded.csv"
-    p = DATA_DIR / safe
+    """Store raw (plain or compressed) CSV bytes under data/ with the store codec; keeps an existing file."""
+    p = DATA_DIR / stored_name(_safe_name(name))
     if not p.exists():
-        p.write_bytes(raw)
+        dec = Decompressor(detect_codec(raw[:4]))
+        data = dec.feed(raw)
+        dec.finish()
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        with open(p, "wb") as f:
+            w = open_writer(f)
+            w.write(data)
+            w.close()
     return p
 
+class SavedUpload(NamedTuple):
+    path: Path
+    sha256: str   # of the logical (decompressed) CSV
+    size: int     # logical bytes
+    head: bytes   # first logical bytes, enough to sniff the header
+    stored_size: int = 0  # bytes on disk
+
+class _UploadSink:
+    """
+    Blocking half of save_upload_unique: decompresses, hashes and writes one
+    chunk at a time (and re-compresses with the store codec). Run in the
+    threadpool, so a large upload never holds the event loop.
+    """
+    def __init__(self, out: BinaryIO):
+        self.out = out
+        self.h = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.codec: Optional[str] = None
+        self.dec: Optional[Decompressor] = None
+        self.writer = None
+
+    def feed(self, chunk: bytes) -> None:
+        try:
+            if self.dec is None:
+                self.codec = detect_codec(chunk[:4])
+                self.dec = Decompressor(self.codec)
+                # already in the store codec: keep the client's bytes as they are
+                self.writer = self.out if self.codec == STORE_CODEC else open_writer(self.out)
+            data = self.dec.feed(chunk)
+        except CodecUnavailable as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Corrupt {self.codec} upload: {e}")
+        if len(self.head) < 4096:
+            self.head += data[: 4096 - len(self.head)]
+        self.h.update(data)
+        self.size += len(data)
+        self.writer.write(chunk if self.writer is self.out else data)
+
+    def finish(self) -> None:
+        if self.dec is not None:
+            try:
+                self.dec.finish()
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Corrupt {self.codec} upload: {e}")
+        self.close()
+
+    def close(self) -> None:
+        if self.out.closed:
+            return
+        try:
+            if self.writer is not None and self.writer is not self.out:
+                self.writer.close()
+        finally:
+            self.out.close()
+
+def _place_upload(tmp: Path, base: str, sha: str) -> Path:
+    """Move a finished upload to its name in data/ (hashes an existing file of that name)."""
+    target = DATA_DIR / stored_name(base)
+    if target.exists() and sha256_file(target) != sha:
+        stem, ext = os.path.splitext(base)
+        target = DATA_DIR / stored_name(f"{stem}_{sha[:8]}{ext}")
+    if target.exists():
+        tmp.unlink()
+    else:
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600
+        os.replace(tmp, target)
+    return target
+
+async def save_upload_unique(name: str, upload: "UploadFile") -> SavedUpload:
+    """
+    Stream an upload to data/ in chunks, hashing as it is written. The upload
+    may be plain, gzip or zstd (sniffed from its first bytes); it is hashed on
+    the decompressed content and stored with CSV_STORE_COMPRESSION. Like
+    save_bytes_unique an existing file with the same content is kept; a
+    different file that collides by name is stored as <stem>_<sha8><ext>.
+    Decompression, compression, writes and hashing run in the threadpool.
+    """
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    base = logical_name(_safe_name(name))
+    fd, tmp_name = tempfile.mkstemp(dir=DATA_DIR, prefix=".upload-", suffix=".part")
+    tmp = Path(tmp_name)
+    sink = _UploadSink(os.fdopen(fd, "wb"))
+    try:
+        while chunk := await upload.read(HASH_CHUNK):
+            await run_in_threadpool(sink.feed, chunk)
+        await run_in_threadpool(sink.finish)
+        if not sink.size:
+            raise HTTPException(status_code=400, detail="Empty file")
+        sha = sink.h.hexdigest()
+        target = await run_in_threadpool(_place_upload, tmp, base, sha)
+        return SavedUpload(target, sha, sink.size, sink.head, target.stat().st_size)
+    finally:
+        sink.close()
+        tmp.unlink(missing_ok=True)
+
+def _server_csv_path(filename: str) -> Path:
+    # 'bom.csv' also finds 'bom.csv.gz' / 'bom.csv.zst' (and vice versa)
+    for name in (filename, stored_name(filename), *(stored_name(filename, c) for c in ("gzip", "zstd", None))):
+        p = DATA_DIR / name
+        if p.exists():
+            return p
+    raise HTTPException(status_code=404, detail=f"CSV not found on server: {filename}")
+
+def list_server_csvs() -> List[Path]:
+    """CSV files in data/, plain or compressed, newest first."""
+    files = [p for pat in ("*.csv", "*.csv.gz", "*.csv.zst") for p in DATA_DIR.glob(pat)]
+    return sorted(files, key=lambda x: x.stat().st_mtime, reverse=True)
+
+def hash_server_csv(
+    filename: str,
+    filter_eng_ids: Optional[Iterable[str]] = None
+) -> Tuple[str, Path, dict]:
+    """
+    Compute the dataset SHA of a CSV in data/ without parsing it: the raw bytes
+    are streamed through SHA-256 and the schema is sniffed from the header.
+    Returns (dataset_sha, path, meta) where meta has schema/filtered/eng_ids.
+    """
+    file_sha, schema, p = hash_and_sniff_server_csv(filename)
+    meta = scope_meta(schema, normalize_eng_ids(filter_eng_ids))
+    return dataset_sha_for(file_sha, schema, meta["eng_ids"]), p, meta
+
+def hash_and_sniff_server_csv(filename: str) -> Tuple[str, Optional[str], Path]:
+    """(file_sha, schema, path) for a CSV in data/ — one streaming read, no parse."""
+    p = _server_csv_path(filename)
+    with open_logical(p) as f:
+        schema = sniff_schema(f.read(4096))
+    return sha256_file(p), schema, p
+
+def parse_csv_file(path: Path, filter_eng_ids: Optional[Iterable[str]] = None) -> tuple[List[Dict], dict]:
+    """parse_csv_text for a stored file; compressed files are decompressed as a stream into the parser."""
+    return _parse_frame(_read_csv_path(path), filter_eng_ids)
+
 def read_server_csv(
     filename: str,
     filter_eng_ids: Optional[Iterable[str]] = None
@@ -177,20 +451,6 @@ def read_server_csv(
     The dataset SHA is made unique per (file, filter_eng_ids) so different scoped imports
     produce distinct datasets and won't dedupe against each other.
     """
-    p = DATA_DIR / filename
-    if not p.exists():
-        raise HTTPException(status_code=404, detail=f"CSV not found on server: {filename}")
-
-    raw = p.read_bytes()
-    text = raw.decode("utf-8", errors="replace")
-
-    rows, meta = parse_csv_text(text, filter_eng_ids=filter_eng_ids)
-
-    file_sha = sha256_bytes(raw)
-    if meta["filtered"] and meta["eng_ids"]:
-        scope_key = "eng_ids:" + ",".join(meta["eng_ids"])
-        dataset_sha = sha256_text(file_sha + "|" + scope_key)
-    else:
-        dataset_sha = file_sha
-
+    dataset_sha, p, _ = hash_server_csv(filename, filter_eng_ids)
+    rows, meta = parse_csv_file(p, filter_eng_ids=filter_eng_ids)
     return dataset_sha, rows, p, meta
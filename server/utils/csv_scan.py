@@ -0,0 +1,264 @@
+# server/utils/csv_scan.py
+"""
+Dry-run validation of a CSV import: the file is fed in chunks as it arrives,
+the header is checked on the first line (an unrecognized schema is rejected
+before the rest is read), and every block of lines is then parsed with the C
+parser and reduced to 64-bit hashes of its nodes, edges and rows. Nothing is
+written anywhere; memory grows with the distinct nodes and edges, not with
+the file.
+"""
+from __future__ import annotations
+import hashlib, io, itertools, re, time
+from typing import Dict, Iterable, List, Optional
+from fastapi import HTTPException
+from utils.csv_import import (
+    CYCLE_POLICY, HASH_CHUNK, _server_csv_path, dataset_sha_for, headers_not_recognized,
+    normalize_eng_ids, schema_for, sniff_header,
+)
+from utils.compression import open_logical
+from utils.graph_checks import cycle_report, MAX_REPORTED
+
+BLOCK = 4 << 20        # parse this many buffered bytes at a time
+MAX_HEADER = 64 << 10  # a header line longer than this is rejected
+COMPACT_AT = 1 << 22   # merge pending distinct keys once this many accumulate
+
+_DASHES = re.compile(r"-+")
+
+def _hash(values):
+    import numpy as np
+    import pandas as pd
+    return pd.util.hash_array(np.asarray(values, dtype=object), categorize=False)
+
+def _factorize_stripped(values):
+    """(codes, names): names[codes] == the stripped values; only distinct values are stripped."""
+    import pandas as pd
+    codes, uniq = pd.factorize(values)
+    return codes, pd.Series(uniq, dtype=object).str.strip().to_numpy(dtype=object)
+
+def _pair(a, b):
+    """Order-sensitive 64-bit key of two hash arrays (wraps on purpose)."""
+    import numpy as np
+    with np.errstate(over="ignore"):
+        return a * np.uint64(0x9E3779B97F4A7C15) ^ b
+
+def _blank_lines(raw: bytes) -> int:
+    """Lines that are empty or just "\r" (the parser skips them)."""
+    import numpy as np
+    b = np.frombuffer(raw, dtype=np.uint8)
+    nl = b == 10
+    cr = b == 13
+    return int(nl[0] + (nl[1:] & nl[:-1]).sum() + (nl[2:] & cr[1:-1] & nl[:-2]).sum()
+               + (len(b) > 1 and cr[0] and nl[1]))
+
+class _Distinct:
+    """Distinct uint64 keys, with optional columns (of `dtypes`) carried along for the first occurrence of each."""
+    def __init__(self, *dtypes: str):
+        self._dtypes = ("uint64", *dtypes)
+        self._parts: List[tuple] = []
+        self._pending = 0
+
+    def add(self, keys, *cols) -> None:
+        self._parts.append((keys, *cols))
+        self._pending += len(keys)
+        if self._pending >= COMPACT_AT:
+            self.compact()
+
+    def compact(self) -> tuple:
+        import numpy as np
+        if not self._parts:
+            return tuple(np.empty(0, dtype=d) for d in self._dtypes)
+        import pandas as pd
+        merged = [np.concatenate(c) for c in zip(*self._parts)]
+        first = ~pd.Series(merged[0]).duplicated().to_numpy()
+        merged = tuple(c[first] for c in merged)
+        self._parts = [merged]
+        self._pending = 0
+        return merged
+
+class CsvScan:
+    """
+    Incremental scan of one CSV's logical (decompressed) bytes: call feed()
+    with chunks in order, then finish() for the report. feed() raises a 400
+    HTTPException as soon as the header shows an unrecognized schema.
+    `eng_ids` restricts a new-schema file to those engines, as a scoped
+    import would.
+    """
+    def __init__(self, eng_ids: Optional[Iterable[str]] = None):
+        self.eng_ids = normalize_eng_ids(eng_ids)
+        self.schema: Optional[str] = None
+        self.sep = ","
+        self.columns: List[str] = []
+        self.bytes = 0
+        self.rows = 0
+        self.rows_in_scope = 0
+        self.malformed = 0
+        self._buf = bytearray()
+        self._sha = hashlib.sha256()
+        self._nodes = _Distinct("object")             # node hash -> name
+        self._edges = _Distinct("uint64", "uint64")   # edge key -> (parent hash, child hash)
+        self._keys = _Distinct()    # row identity (what the import dedupes on)
+        self._children = _Distinct()
+        self._engines: set = set()
+        self._t0 = time.perf_counter()
+
+    # ---- input -------------------------------------------------------
+    def feed(self, chunk: bytes) -> None:
+        self.bytes += len(chunk)
+        self._sha.update(chunk)
+        self._buf += chunk
+        if self.schema is None and not self._read_header():
+            return
+        if len(self._buf) >= BLOCK:
+            cut = self._buf.rfind(b"\n") + 1
+            if cut:
+                self._parse(bytes(self._buf[:cut]))
+                del self._buf[:cut]
+
+    def _read_header(self) -> bool:
+        end = self._buf.find(b"\n")
+        if end < 0:
+            if len(self._buf) > MAX_HEADER:
+                raise HTTPException(status_code=400, detail="CSV header line not found in the first 64 KiB")
+            return False
+        self.sep, self.columns = sniff_header(bytes(self._buf[:end]))
+        del self._buf[:end + 1]
+        self.schema = schema_for(self.columns)
+        if self.schema is None:
+            raise headers_not_recognized(self.columns)
+        return True
+
+    # ---- one block of whole lines ------------------------------------
+    def _parse(self, raw: bytes) -> None:
+        import pandas as pd
+
+        text = raw.decode("utf-8", errors="replace")
+        lines = text.count("\n") + (not text.endswith("\n")) - _blank_lines(raw)
+        if lines <= 0:
+            return
+        df = pd.read_csv(
+            io.StringIO(text), sep=self.sep, header=None, names=self.columns, dtype=str,
+            keep_default_na=False, engine="c", on_bad_lines="skip",
+        )
+        self.rows += len(df)
+        self.malformed += max(0, lines - len(df))
+        if self.schema == "new" and self.eng_ids:
+            df = df[df["engine_id"].isin(self.eng_ids)]
+        self.rows_in_scope += len(df)
+        if len(df):
+            (self._old_block if self.schema == "old" else self._new_block)(df)
+
+    def _add_edges(self, hp, hc) -> None:
+        self._edges.add(_pair(hp, hc), hp, hc)
+        self._children.add(hc)
+
+    def _old_block(self, df) -> None:
+        import numpy as np
+        import pandas as pd
+        n = len(df)
+        codes, names = _factorize_stripped(np.concatenate([df["parent_item"].to_numpy(), df["child_item"].to_numpy()]))
+        h = _hash(names)
+        hp, hc = h[codes[:n]], h[codes[n:]]
+        self._add_edges(hp, hc)
+        self._nodes.add(h, names)
+        # the import keeps one row per (parent, child, level)
+        codes, levels = pd.factorize(df["level"].to_numpy())
+        levels = pd.to_numeric(pd.Series(levels), errors="coerce").fillna(0).to_numpy().astype(np.int64)
+        lvl = levels.astype(np.uint64)[codes]
+        self._keys.add(_pair(_pair(hp, hc), lvl))
+
+    def _new_block(self, df) -> None:
+        import numpy as np
+        import pandas as pd
+        n = len(df)
+        # every path's steps with one C-level split: joined by the separator itself, path i
+        # contributes exactly count("->") + 1 parts
+        paths = df["path"].to_numpy()
+        per_path = np.fromiter(map(str.count, paths, itertools.repeat("->")), dtype=np.int64, count=n) + 1
+        steps = np.array("->".join(paths).split("->"), dtype=object)
+        row = np.repeat(np.arange(n), per_path)
+        cols = [df[c].to_numpy() for c in ("engine_id", "system_id", "parent_item_id", "child_item_id")]
+        codes, names = _factorize_stripped(np.concatenate([*cols, steps]))
+        empty = names == ""
+        ce, cs, cp, cc = (codes[i * n:(i + 1) * n] for i in range(4))
+
+        # the importer's three edge sources: engine -> system, parent -> child, consecutive path steps
+        # (after dropping empty steps and a leading run of dashes, as in "-->A->B")
+        sc = codes[4 * n:]
+        first = np.concatenate([[True], row[1:] != row[:-1]])
+        dashes = np.zeros(len(names), dtype=bool)
+        lead = np.unique(sc[first])
+        dashes[lead] = [_DASHES.fullmatch(x) is not None for x in names[lead]]
+        keep = ~empty[sc] & ~(first & dashes[sc])
+        row, sc = row[keep], sc[keep]
+        same = row[1:] == row[:-1]
+        m1 = ~empty[ce] & ~empty[cs]
+        m2 = ~empty[cp] & ~empty[cc]
+        src = np.concatenate([ce[m1], cp[m2], sc[:-1][same]])
+        dst = np.concatenate([cs[m1], cc[m2], sc[1:][same]])
+
+        h = _hash(names)
+        self._add_edges(h[src], h[dst])
+        used = np.unique(np.concatenate([src, dst]))
+        self._nodes.add(h[used], names[used])
+        self._engines.update(names[np.unique(ce[~empty[ce]])])
+        rest = pd.util.hash_pandas_object(df[["path", "bom_level", "sequenceno"]], index=False).to_numpy()
+        self._keys.add(_pair(_pair(_pair(h[ce], h[cs]), _pair(h[cp], h[cc])), rest))
+
+    # ---- report --------------------------------------------------------
+    def finish(self) -> Dict:
+        """Parse what is left and summarize."""
+        import numpy as np
+        import pandas as pd
+
+        if self.schema is None:
+            if not self._buf.strip():
+                raise HTTPException(status_code=400, detail="Empty file")
+            self._buf += b"\n"
+            self._read_header()
+        if self._buf.strip():
+            self._parse(bytes(self._buf))
+        self._buf.clear()
+
+        node_keys, node_names = self._nodes.compact()
+        edge_keys, hp, hc = self._edges.compact()
+        (child_keys,) = self._children.compact()
+        (row_keys,) = self._keys.compact()
+
+        # cycle check on the distinct edges, nodes numbered by their position in node_keys
+        nodes = pd.Index(node_keys)
+        cycles = cycle_report(nodes.get_indexer(hp), nodes.get_indexer(hc), pd.Index(node_names))
+
+        rows_out = len(row_keys) if self.schema == "old" else len(edge_keys)
+        engines = sorted(self._engines)
+        file_sha = self._sha.hexdigest()
+        return {
+            "sha256": file_sha,
+            "dataset_sha256": dataset_sha_for(file_sha, self.schema, self.eng_ids),
+            "schema": self.schema,
+            "delimiter": self.sep,
+            "columns": self.columns,
+            "filtered": bool(self.schema == "new" and self.eng_ids),
+            "eng_ids": self.eng_ids if self.schema == "new" else None,
+            "bytes": self.bytes,
+            "rows_in": self.rows,
+            "rows_in_scope": self.rows_in_scope,
+            "malformed_rows": self.malformed,
+            "duplicate_rows": self.rows_in_scope - len(row_keys),
+            "rows_out": rows_out,
+            "distinct_nodes": len(node_keys),
+            "edges": len(edge_keys),
+            "roots": int((~pd.Series(node_keys).isin(child_keys)).sum()),
+            "engine_ids_found": {"count": len(engines), "sample": engines[:MAX_REPORTED]} if self.schema == "new" else None,
+            "cycles": cycles,
+            # the import's parser rejects the whole file on a line with too many fields
+            "would_import": not self.malformed and (not cycles["has_cycles"] or CYCLE_POLICY == "warn"),
+            "elapsed_ms": round((time.perf_counter() - self._t0) * 1000, 1),
+        }
+
+def scan_server_csv(filename: str, eng_ids: Optional[Iterable[str]] = None) -> Dict:
+    """CsvScan report for a CSV in data/ (plain or compressed), read as a stream."""
+    scan = CsvScan(eng_ids)
+    with open_logical(_server_csv_path(filename)) as f:
+        while chunk := f.read(HASH_CHUNK):
+            scan.feed(chunk)
+    return scan.finish()
@@ -0,0 +1,112 @@
+# server/utils/graph_checks.py
+from __future__ import annotations
+import os
+from typing import Dict, Iterable, List, Tuple
+
+# How many cycles/self-loops to list in a report (counts are always complete)
+MAX_REPORTED = int(os.getenv("CYCLE_REPORT_LIMIT", "20"))
+EDGES_PER_CYCLE = 50  # offending edges listed per cycle group
+TRIM_ROUNDS = 64      # degree-trimming passes before the exact SCC pass
+
+def find_cycles(parents: Iterable[str], children: Iterable[str], limit: int = MAX_REPORTED) -> Dict:
+    """
+    Detect cycles in a parent->child edge list in O(V + E).
+
+    Edges that cannot lie on a cycle are trimmed first with vectorized degree
+    counts (a tree trims away completely in `depth` rounds); an iterative Tarjan
+    SCC pass runs on whatever remains. Every strongly connected component with
+    more than one node is a cycle group and its offending edges are the edges
+    inside it. Self-loops (A -> A) are reported separately. Returns
+        {"has_cycles", "self_loops", "cycles": [{"size", "nodes", "edges"}], "cyclic_edges", "truncated"}
+    with at most `limit` groups/self-loops and EDGES_PER_CYCLE edges per group listed.
+    """
+    import pandas as pd
+
+    parents, children = pd.Series(list(parents), dtype=object), pd.Series(list(children), dtype=object)
+    m = len(parents)
+    codes, names = pd.factorize(pd.concat([parents, children], ignore_index=True).astype(str))
+    return cycle_report(codes[:m], codes[m:], names, limit)
+
+def cycle_report(src, dst, names, limit: int = MAX_REPORTED) -> Dict:
+    """find_cycles for edges already encoded as integer arrays of positions in `names`."""
+    import numpy as np
+
+    n = len(names)
+    loops = src == dst
+    self_loops = [[names[a], names[a]] for a in src[loops][:limit]]
+    src, dst = src[~loops], dst[~loops]
+    for _ in range(TRIM_ROUNDS):
+        # an edge a->b can only be on a cycle if a has a parent and b has a child
+        keep = (np.bincount(dst, minlength=n)[src] > 0) & (np.bincount(src, minlength=n)[dst] > 0)
+        if keep.all():
+            break
+        src, dst = src[keep], dst[keep]
+
+    groups = _cyclic_components(src.tolist(), dst.tolist())
+    groups.sort(key=lambda g: -len(g))
+    cycles = [
+        {
+            "size": len({x for e in g for x in e}),
+            "nodes": sorted({names[x] for e in g[:EDGES_PER_CYCLE] for x in e}),
+            "edges": [[names[a], names[b]] for a, b in g[:EDGES_PER_CYCLE]],
+        }
+        for g in groups[:limit]
+    ]
+    n_loops = int(loops.sum())
+    return {
+        "has_cycles": bool(groups) or n_loops > 0,
+        "self_loops": self_loops,
+        "cycles": cycles,
+        "cyclic_edges": sum(len(g) for g in groups) + n_loops,
+        "truncated": len(groups) > limit or n_loops > limit or any(len(g) > EDGES_PER_CYCLE for g in groups),
+    }
+
+def _cyclic_components(src: List[int], dst: List[int]) -> List[List[Tuple[int, int]]]:
+    """Iterative Tarjan SCC; returns the edges of each component with more than one node."""
+    adj: Dict[int, List[int]] = {}
+    for a, b in zip(src, dst):
+        adj.setdefault(a, []).append(b)
+        adj.setdefault(b, [])
+    index: Dict[int, int] = {}
+    low: Dict[int, int] = {}
+    comp: Dict[int, int] = {}
+    on_stack = set()
+    stack: List[int] = []
+    counter = n_comp = 0
+
+    for root in adj:
+        if root in index:
+            continue
+        index[root] = low[root] = counter; counter += 1
+        stack.append(root); on_stack.add(root)
+        work = [(root, 0)]
+        while work:
+            v, i = work[-1]
+            if i < len(adj[v]):
+                work[-1] = (v, i + 1)
+                w = adj[v][i]
+                if w not in index:
+                    index[w] = low[w] = counter; counter += 1
+                    stack.append(w); on_stack.add(w)
+                    work.append((w, 0))
+                elif w in on_stack:
+                    low[v] = min(low[v], index[w])
+                continue
+            work.pop()
+            if work:
+                u = work[-1][0]
+                low[u] = min(low[u], low[v])
+            if low[v] == index[v]:
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    comp[w] = n_comp
+                    if w == v:
+                        break
+                n_comp += 1
+
+    groups: Dict[int, List[Tuple[int, int]]] = {}
+    for a, b in zip(src, dst):
+        if comp[a] == comp[b]:  # both ends in one SCC -> the SCC has >1 node (no self-loops here)
+            groups.setdefault(comp[a], []).append((a, b))
+    return list(groups.values())
@@ -2,7 +2,7 @@
 from __future__ import annotations
 from pathlib import Path
 from fastapi import HTTPException
-from utils.sample_data import clear_data, add_relationship, get_sample_data
+from utils.sample_data import clear_data, load_relationships_frame, relationship_count
 import pandas as pd, io
 
 DATA_DIR = Path(__file__).resolve().parents[1] / "data"
@@ -131,23 +131,20 @@ def load_csv_file(path: Path) -> int:
             if rel_key not in relationships:
                 relationships[rel_key] = (sequence, level)
     
-    # Add all relationships to store
-    for (parent, child), (sequence, level) in relationships.items():
-        add_relationship(
-            parent=parent,
-            child=child,
-            sequence=sequence,
-            level=level,
-        )
+    # Bulk-load all relationships into the store
+    load_relationships_frame(pd.DataFrame(
+        [(parent, child, sequence, level) for (parent, child), (sequence, level) in relationships.items()],
+        columns=["parent_item", "child_item", "sequence_no", "level"],
+    ))
     
-    return len(get_sample_data())
+    return relationship_count()
 
 def latest_csv() -> Path | None:
     files = sorted(DATA_DIR.glob("*.csv"), key=lambda p: p.stat().st_mtime, reverse=True)
     return files[0] if files else None
 
 def ensure_data_loaded() -> dict:
-    if get_sample_data():
+    if relationship_count():
         return {"loaded": False, "reason": "already_in_memory"}
     p = latest_csv()
     if not p:
@@ -0,0 +1,262 @@
+# server/utils/metrics.py
+from __future__ import annotations
+import logging, os, time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Any
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+
+log = logging.getLogger("dvp.sql")
+
+# Histogram bucket upper bounds in milliseconds; an implicit +inf bucket follows.
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Opt-in slow query log: statements slower than this many ms are logged (0 = off).
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0") or 0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (ms). Cheap enough to update on every request."""
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation (max for the +inf bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else round(self.max, 3)
+        return round(self.max, 3)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 3) if self.count else None,
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                **{f"le_{b}": c for b, c in zip(BUCKETS_MS, self.counts)},
+                "le_inf": self.counts[-1],
+            },
+        }
+
+
+@dataclass
+class RequestStats:
+    """SQL work done while serving one request (held in a contextvar)."""
+    queries: int = 0
+    db_ms: float = 0.0
+
+
+@dataclass
+class RouteStats:
+    latency: Histogram = field(default_factory=Histogram)
+    statuses: Dict[str, int] = field(default_factory=dict)
+    queries_total: int = 0
+    queries_max: int = 0
+    db_ms_total: float = 0.0
+
+    def to_dict(self) -> dict:
+        n = self.latency.count
+        return {
+            "latency": self.latency.to_dict(),
+            "statuses": dict(self.statuses),
+            "queries_total": self.queries_total,
+            "queries_per_request": round(self.queries_total / n, 2) if n else None,
+            "queries_max": self.queries_max,
+            "db_ms_total": round(self.db_ms_total, 3),
+        }
+
+
+@dataclass
+class EngineStats:
+    label: str
+    engine: Optional[Engine] = None
+    statements: int = 0
+    errors: int = 0
+    db_ms_total: float = 0.0
+    checkout: Histogram = field(default_factory=Histogram)
+    profile: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        pool = self.engine.pool if self.engine is not None else None
+        return {
+            "statements": self.statements,
+            "errors": self.errors,
+            "db_ms_total": round(self.db_ms_total, 3),
+            "checkout_wait": self.checkout.to_dict(),
+            "pool": pool.status() if pool is not None else None,
+            "profile": self.profile,
+        }
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("dvp_request_stats", default=None)
+_routes: Dict[str, RouteStats] = {}
+_engines: Dict[str, EngineStats] = {}
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+# ---------------------------------------------------------------------
+# SQLAlchemy hooks
+# ---------------------------------------------------------------------
+def engine_label(engine: AsyncEngine | Engine) -> str:
+    return engine.url.render_as_string(hide_password=True)
+
+
+def detach_engine(engine: AsyncEngine | Engine) -> None:
+    """Drop the stats' reference to a disposed engine (its counters are kept)."""
+    stats = _engines.get(engine_label(engine))
+    sync = getattr(engine, "sync_engine", engine)
+    if stats is not None and stats.engine is sync:
+        stats.engine = None
+
+
+def _time_checkouts(pool, stats: EngineStats) -> None:
+    """Wrap pool.connect() so the time spent waiting for a connection is recorded."""
+    connect = pool.connect
+
+    def timed_connect():
+        t0 = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            stats.checkout.observe((time.perf_counter() - t0) * 1000)
+
+    pool.connect = timed_connect
+
+
+def instrument_engine(engine: AsyncEngine, profile: Optional[str] = None) -> AsyncEngine:
+    """
+    Attach statement counting/timing and pool checkout timing to an engine.
+    Counts go both to the per-engine totals and to the current request (if any).
+    """
+    sync = engine.sync_engine
+    label = engine_label(engine)
+    stats = _engines.setdefault(label, EngineStats(label))
+    stats.engine = sync
+    stats.profile = profile
+
+    @event.listens_for(sync, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("dvp_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        ms = (time.perf_counter() - conn.info["dvp_query_start"].pop()) * 1000
+        stats.statements += 1
+        stats.db_ms_total += ms
+        req = _request_stats.get()
+        if req is not None:
+            req.queries += 1
+            req.db_ms += ms
+        if SLOW_QUERY_MS and ms >= SLOW_QUERY_MS:
+            log.warning("slow query %.1f ms on %s: %s", ms, label, " ".join(statement.split())[:500])
+
+    @event.listens_for(sync, "handle_error")
+    def _error(ctx):
+        starts = ctx.connection.info.get("dvp_query_start") if ctx.connection is not None else None
+        if starts:
+            starts.pop()
+        stats.errors += 1
+
+    _time_checkouts(sync.pool, stats)
+    return engine
+
+
+# ---------------------------------------------------------------------
+# ASGI middleware
+# ---------------------------------------------------------------------
+class MetricsMiddleware:
+    """
+    Records latency per route template (e.g. 'GET /api/child_node') and the
+    number of SQL statements / DB time each request issued. Adds a
+    Server-Timing header so the numbers are visible in browser dev tools.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        req = RequestStats()
+        token = _request_stats.set(req)
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f'db;dur={req.db_ms:.1f};desc="{req.queries} queries"')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            if scope.get("dvp.client_disconnected"):
+                status = 499  # client closed the request (nginx convention)
+            route = scope.get("route")
+            path = getattr(route, "path", None)
+            if path is None:
+                # plain Starlette routes (/docs, /openapi.json) carry no route; 404s are bucketed together
+                path = scope["path"] if status != 404 else "<unmatched>"
+            key = f'{scope["method"]} {path}'
+            rs = _routes.get(key)
+            if rs is None:
+                rs = _routes[key] = RouteStats()
+            rs.latency.observe((time.perf_counter() - t0) * 1000)
+            code = f"{status // 100}xx"
+            rs.statuses[code] = rs.statuses.get(code, 0) + 1
+            rs.queries_total += req.queries
+            rs.queries_max = max(rs.queries_max, req.queries)
+            rs.db_ms_total += req.db_ms
+
+
+# ---------------------------------------------------------------------
+# snapshot / reset
+# ---------------------------------------------------------------------
+def snapshot() -> Dict[str, Any]:
+    return {
+        "pid": os.getpid(),
+        "slow_query_ms": SLOW_QUERY_MS or None,
+        "routes": {k: v.to_dict() for k, v in sorted(_routes.items())},
+        "engines": {k: v.to_dict() for k, v in sorted(_engines.items())},
+    }
+
+
+def reset() -> None:
+    _routes.clear()
+    for st in _engines.values():
+        st.statements = 0
+        st.errors = 0
+        st.db_ms_total = 0.0
+        st.checkout = Histogram()
@@ -1,37 +1,157 @@
 # server/data/sample_data.py
 from __future__ import annotations
-from typing import List, Dict
+from array import array
+from typing import List, Dict, TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 class SampleData:
+    """
+    Compact in-memory edge store used by the legacy CSV loader.
+
+    Node ids are interned to ints and each edge is four int32 columns
+    (parent, child, sequence_no, level). Parent->children and child->parents
+    lookups go through CSR indexes (offsets + edge order) that are rebuilt
+    lazily after writes, so a lookup costs O(degree).
+    """
     def __init__(self):
-        self._data: List[Dict] = []  # start empty; CSV loader populates
+        self.clear()
 
-    def get(self) -> List[Dict]:
-        return self._data
+    # ---- interning -------------------------------------------------
+    def _intern(self, name: str) -> int:
+        i = self._ids.get(name)
+        if i is None:
+            i = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return i
 
+    # ---- writes ----------------------------------------------------
     def add(self, parent: str, child: str, sequence: int, level: int) -> Dict:
-        item = {
-            "parent_item": parent,
-            "child_item": child,
-            "sequence_no": sequence,
-            "level": level,
-        }
-        self._data.append(item)
-        return item
+        self._pending[0].append(self._intern(parent))
+        self._pending[1].append(self._intern(child))
+        self._pending[2].append(int(sequence))
+        self._pending[3].append(int(level))
+        self._index = None
+        return {"parent_item": parent, "child_item": child, "sequence_no": sequence, "level": level}
+
+    def load_frame(self, df: "pd.DataFrame") -> int:
+        """
+        Bulk-append a DataFrame with parent_item, child_item, sequence_no, level
+        columns. Ids are factorized in one pass instead of interned row by row.
+        Returns the number of edges added.
+        """
+        import pandas as pd
+
+        n = int(df.shape[0])
+        if not n:
+            return 0
+        codes, uniques = pd.factorize(
+            pd.concat([df["parent_item"], df["child_item"]], ignore_index=True).astype(str)
+        )
+        lut = np.fromiter((self._intern(u) for u in uniques), dtype=np.int32, count=len(uniques))
+        ids = lut[codes]
+        self._flush()
+        self._parent = np.concatenate([self._parent, ids[:n]])
+        self._child = np.concatenate([self._child, ids[n:]])
+        self._seq = np.concatenate([self._seq, df["sequence_no"].to_numpy(dtype=np.int32)])
+        self._level = np.concatenate([self._level, df["level"].to_numpy(dtype=np.int32)])
+        self._index = None
+        return n
 
     def clear(self) -> None:
-        self._data = []
+        self._names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._parent = np.empty(0, dtype=np.int32)
+        self._child = np.empty(0, dtype=np.int32)
+        self._seq = np.empty(0, dtype=np.int32)
+        self._level = np.empty(0, dtype=np.int32)
+        self._pending = tuple(array("i") for _ in range(4))
+        self._index = None
+
+    def _flush(self) -> None:
+        """Move edges added one by one into the numpy columns."""
+        if not len(self._pending[0]):
+            return
+        cols = [np.frombuffer(buf, dtype=np.int32) for buf in self._pending]
+        self._parent = np.concatenate([self._parent, cols[0]])
+        self._child = np.concatenate([self._child, cols[1]])
+        self._seq = np.concatenate([self._seq, cols[2]])
+        self._level = np.concatenate([self._level, cols[3]])
+        self._pending = tuple(array("i") for _ in range(4))
+
+    # ---- indexes ---------------------------------------------------
+    def _build_index(self) -> dict:
+        self._flush()
+        n_nodes = len(self._names)
+        # children ordered by sequence_no, parents by (level, sequence_no)
+        by_parent = np.lexsort((self._seq, self._parent)).astype(np.int32)
+        by_child = np.lexsort((self._seq, self._level, self._child)).astype(np.int32)
+        out_off = np.zeros(n_nodes + 1, dtype=np.int64)
+        in_off = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._parent, minlength=n_nodes), out=out_off[1:])
+        np.cumsum(np.bincount(self._child, minlength=n_nodes), out=in_off[1:])
+        return {"out": (out_off, by_parent), "in": (in_off, by_child)}
+
+    def _edges_of(self, node: str, direction: str) -> np.ndarray:
+        i = self._ids.get(node)
+        if i is None:
+            return np.empty(0, dtype=np.int32)
+        if self._index is None:
+            self._index = self._build_index()
+        off, order = self._index[direction]
+        return order[off[i]:off[i + 1]]
+
+    def _row(self, e: int) -> Dict:
+        return {
+            "parent_item": self._names[self._parent[e]],
+            "child_item": self._names[self._child[e]],
+            "sequence_no": int(self._seq[e]),
+            "level": int(self._level[e]),
+        }
+
+    # ---- reads -----------------------------------------------------
+    def children_of(self, parent: str) -> List[Dict]:
+        """Edges whose parent is `parent`, ordered by sequence_no. O(out-degree)."""
+        return [self._row(e) for e in self._edges_of(parent, "out")]
+
+    def parents_of(self, child: str) -> List[Dict]:
+        """Edges whose child is `child`, ordered by (level, sequence_no). O(in-degree)."""
+        return [self._row(e) for e in self._edges_of(child, "in")]
+
+    def __len__(self) -> int:
+        return int(self._parent.shape[0]) + len(self._pending[0])
+
+    def get(self) -> List[Dict]:
+        """Materialize every edge as a dict (O(n); prefer the lookup methods)."""
+        self._flush()
+        return [self._row(e) for e in range(len(self))]
+
+    def nbytes(self) -> int:
+        cols = self._parent.nbytes + self._child.nbytes + self._seq.nbytes + self._level.nbytes
+        if self._index is not None:
+            cols += sum(off.nbytes + order.nbytes for off, order in self._index.values())
+        return cols
 
     def info(self) -> Dict:
+        self._flush()
+        n = len(self)
         return {
-            "total_relationships": len(self._data),
-            "data_preview": self._data[:10],
-            "is_empty": len(self._data) == 0,
+            "total_relationships": n,
+            "total_nodes": len(self._names),
+            "edge_bytes": self.nbytes(),
+            "data_preview": [self._row(e) for e in range(min(n, 10))],
+            "is_empty": n == 0,
         }
 
 _store = SampleData()
 
 def get_sample_data(): return _store.get()
 def add_relationship(parent: str, child: str, sequence: int, level: int): return _store.add(parent, child, sequence, level)
+def load_relationships_frame(df: "pd.DataFrame") -> int: return _store.load_frame(df)
+def get_children(parent: str) -> List[Dict]: return _store.children_of(parent)
+def get_parents(child: str) -> List[Dict]: return _store.parents_of(child)
+def relationship_count() -> int: return len(_store)
 def clear_data(): _store.clear()
 def get_data_info(): return _store.info()
@@ -0,0 +1,67 @@
+# server/utils/singleflight.py
+from __future__ import annotations
+import asyncio, os
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from utils.cancellation import client_gone
+
+ENABLED = os.getenv("SINGLE_FLIGHT", "1") != "0"
+
+class _Abandoned(Exception):
+    """The leader stopped for reasons of its own (client gone); followers must run the call themselves."""
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls: the first caller for a key (the
+    leader) runs the call and every caller arriving while it is in flight
+    awaits the same result instead of issuing its own query. Nothing is kept
+    once the call finishes, so this is not a cache; results are shared
+    between callers and must be treated as read-only.
+
+    A follower never inherits the leader's cancellation: if the leader's
+    client disconnects, followers run the call themselves.
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.shared = 0
+        self.retried = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._calls.get(key)
+        if fut is not None:
+            self.shared += 1
+            try:
+                return await asyncio.shield(fut)
+            except _Abandoned:
+                self.retried += 1
+                return await self.do(key, fn)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._calls[key] = fut
+        self.leaders += 1
+        try:
+            result = await fn()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError) or client_gone():
+                fut.set_exception(_Abandoned())
+            else:
+                fut.set_exception(e)
+            fut.exception()  # mark retrieved: there may be no followers
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": ENABLED,
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "retried": self.retried,
+        }
+
+flights = SingleFlight()
@@ -0,0 +1,181 @@
+# server/utils/tree_layout.py
+"""
+Tidy-tree layout (Reingold-Tilford with Walker's O(n) improvements, as
+Buchheim et al. describe it), matching d3-hierarchy's `tree().nodeSize()` so
+server coordinates line up with what frontend/src/assets/core/TreeLayout.tsx
+computes in the browser. Both walks are iterative, so deep trees are fine.
+"""
+from __future__ import annotations
+import os
+from collections import OrderedDict
+from typing import Dict, Hashable, List, NamedTuple, Optional
+
+CACHE_SIZE = int(os.getenv("LAYOUT_CACHE_SIZE", "64"))
+
+class LayoutParams(NamedTuple):
+    orientation: str = "horizontal"  # "horizontal": root left, grows right | "vertical": root top, grows down
+    node_width: float = 180
+    node_height: float = 60
+    spacing: float = 20
+
+    def node_size(self) -> tuple[float, float]:
+        """(sibling step, depth step), as TreeLayout.tsx passes them to d3's nodeSize()."""
+        if self.orientation == "horizontal":
+            return self.node_height + self.spacing, self.node_width + self.spacing * 3
+        return self.node_width + self.spacing, self.node_height + self.spacing * 3
+
+class _N:
+    __slots__ = ("id", "parent", "children", "i", "depth", "A", "a", "z", "m", "c", "s", "t")
+
+    def __init__(self, id: Optional[str], parent: Optional["_N"], i: int, depth: int):
+        self.id, self.parent, self.i, self.depth = id, parent, i, depth
+        self.children: List[_N] = []
+        self.A = None
+        self.a = self
+        self.z = self.m = self.c = self.s = 0.0
+        self.t = None
+
+def _separation(a: _N, b: _N) -> float:
+    return 1.0 if a.parent is b.parent else 2.0
+
+def _next_left(v: _N):
+    return v.children[0] if v.children else v.t
+
+def _next_right(v: _N):
+    return v.children[-1] if v.children else v.t
+
+def _move_subtree(wm: _N, wp: _N, shift: float) -> None:
+    change = shift / (wp.i - wm.i)
+    wp.c -= change
+    wp.s += shift
+    wm.c += change
+    wp.z += shift
+    wp.m += shift
+
+def _execute_shifts(v: _N) -> None:
+    shift = change = 0.0
+    for w in reversed(v.children):
+        w.z += shift
+        w.m += shift
+        change += w.c
+        shift += w.s + change
+
+def _apportion(v: _N, w: Optional[_N], ancestor: _N) -> _N:
+    if w is None:
+        return ancestor
+    vip = vop = v
+    vim = w
+    vom = v.parent.children[0]
+    sip, sop, sim, som = vip.m, vop.m, vim.m, vom.m
+    vim, vip = _next_right(vim), _next_left(vip)
+    while vim is not None and vip is not None:
+        vom = _next_left(vom)
+        vop = _next_right(vop)
+        vop.a = v
+        shift = vim.z + sim - vip.z - sip + _separation(vim, vip)
+        if shift > 0:
+            _move_subtree(vim.a if vim.a.parent is v.parent else ancestor, v, shift)
+            sip += shift
+            sop += shift
+        sim += vim.m
+        sip += vip.m
+        som += vom.m
+        sop += vop.m
+        vim, vip = _next_right(vim), _next_left(vip)
+    if vim is not None and _next_right(vop) is None:
+        vop.t = vim
+        vop.m += sim - sop
+    if vip is not None and _next_left(vom) is None:
+        vom.t = vip
+        vom.m += sip - som
+        ancestor = v
+    return ancestor
+
+def layout(root: str, children: Dict[str, List[str]], params: LayoutParams = LayoutParams()) -> List[dict]:
+    """
+    Lay out the tree under `root` (`children` maps a node to its ordered
+    children; every node must appear once). Returns
+    [{"id", "parent", "depth", "x", "y"}] in breadth-first order, with x/y
+    already mapped to screen axes for params.orientation.
+    """
+    fake = _N(None, None, 0, -1)
+    top = _N(root, fake, 0, 0)
+    fake.children = [top]
+    order = [top]  # breadth-first: parents before children
+    for v in order:
+        v.children = [_N(c, v, i, v.depth + 1) for i, c in enumerate(children.get(v.id, ()))]
+        order.extend(v.children)
+
+    # first walk, in post-order (left siblings' subtrees before a node, children before parents)
+    post: List[_N] = []
+    stack = [top]
+    while stack:
+        v = stack.pop()
+        post.append(v)
+        stack.extend(v.children)
+    # `post` is now root, right-to-left pre-order; reversed it is left-to-right post-order
+    for v in reversed(post):
+        siblings = v.parent.children
+        w = siblings[v.i - 1] if v.i else None
+        if v.children:
+            _execute_shifts(v)
+            midpoint = (v.children[0].z + v.children[-1].z) / 2
+            if w is not None:
+                v.z = w.z + _separation(v, w)
+                v.m = v.z - midpoint
+            else:
+                v.z = midpoint
+        elif w is not None:
+            v.z = w.z + _separation(v, w)
+        v.parent.A = _apportion(v, w, v.parent.A or siblings[0])
+    fake.m = -top.z
+
+    # second walk (pre-order) + nodeSize scaling
+    dx, dy = params.node_size()
+    out = []
+    for v in order:
+        x = v.z + v.parent.m
+        v.m += v.parent.m
+        across, down = x * dx, v.depth * dy
+        if params.orientation == "horizontal":
+            px, py = down, across
+        else:
+            px, py = across, down
+        out.append({"id": v.id, "parent": v.parent.id, "depth": v.depth, "x": round(px, 2), "y": round(py, 2)})
+    return out
+
+class LayoutCache:
+    """Small LRU of computed layouts; keys include the dataset sha, so entries never go stale."""
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._items: "OrderedDict[Hashable, dict]" = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        hit = self._items.get(key)
+        if hit is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return hit
+
+    def put(self, key: Hashable, value: dict) -> None:
+        if self.size <= 0:
+            return
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, db_key: str, sha: str) -> int:
+        """Drop a dataset's layouts (keys start with (database, dataset sha)). Returns how many."""
+        stale = [k for k in self._items if k[:2] == (db_key, sha)]
+        for k in stale:
+            del self._items[k]
+        return len(stale)
+
+    def stats(self) -> dict:
+        return {"cached": len(self._items), "max_size": self.size, "hits": self.hits, "misses": self.misses}
+
+layouts = LayoutCache()
@@ -2,7 +2,7 @@
 from __future__ import annotations
 from fastapi import UploadFile, HTTPException
 from pathlib import Path
-from utils.sample_data import clear_data, add_relationship, get_sample_data
+from utils.sample_data import clear_data, load_relationships_frame, relationship_count
 import pandas as pd
 import io, re
 
@@ -169,16 +169,13 @@ def _load_df_into_store(df: pd.DataFrame) -> int:
                     if rel_key not in relationships:
                         relationships[rel_key] = (0, level)
     
-    # Add all relationships to store
-    for (parent, child), (sequence, level) in relationships.items():
-        add_relationship(
-            parent=parent,
-            child=child,
-            sequence=sequence,
-            level=level,
-        )
+    # Bulk-load all relationships into the store
+    load_relationships_frame(pd.DataFrame(
+        [(parent, child, sequence, level) for (parent, child), (sequence, level) in relationships.items()],
+        columns=["parent_item", "child_item", "sequence_no", "level"],
+    ))
     
-    return len(get_sample_data())
+    return relationship_count()
 
 # ---- main API ----
 async def upload_csv(file: UploadFile):